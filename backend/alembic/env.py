@@ -1,6 +1,5 @@
 from logging.config import fileConfig
 
-from sqlalchemy import engine_from_config, pool
 from alembic import context
 
 import os
@@ -8,7 +7,8 @@ import sys
 
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 
-from app.repos import Base  # noqa: E402
+from app.config import get_settings  # noqa: E402
+from app.repos import Base, get_sync_engine, to_sync_url  # noqa: E402
 
 
 config = context.config
@@ -19,19 +19,21 @@ if config.config_file_name is not None:
 target_metadata = Base.metadata
 
 
+def _db_url() -> str:
+    # DB_URL from the environment wins over alembic.ini, matching the app
+    url = os.getenv("DB_URL") or config.get_main_option("sqlalchemy.url") or get_settings().DB_URL
+    return to_sync_url(url)
+
+
 def run_migrations_offline() -> None:
-    url = config.get_main_option("sqlalchemy.url")
+    url = _db_url()
     context.configure(url=url, target_metadata=target_metadata, literal_binds=True)
     with context.begin_transaction():
         context.run_migrations()
 
 
 def run_migrations_online() -> None:
-    connectable = engine_from_config(
-        config.get_section(config.config_ini_section),
-        prefix="sqlalchemy.",
-        poolclass=pool.NullPool,
-    )
+    connectable = get_sync_engine(_db_url())
 
     with connectable.connect() as connection:
         context.configure(connection=connection, target_metadata=target_metadata)
@@ -0,0 +1,28 @@
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0002_result_cache'
+down_revision = '0001_init'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'result_cache',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('content_hash', sa.String(64), nullable=False),
+        sa.Column('model_version', sa.String(64), nullable=False),
+        sa.Column('probability', sa.Float()),
+        sa.Column('summary', sa.Text()),
+        sa.Column('feature_summary', sa.Text()),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now()),
+        sa.UniqueConstraint('content_hash', 'model_version', name='uq_result_cache_hash_version'),
+    )
+    op.create_index('ix_result_cache_created_at', 'result_cache', ['created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_result_cache_created_at', table_name='result_cache')
+    op.drop_table('result_cache')
@@ -0,0 +1,18 @@
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0003_result_segments'
+down_revision = '0002_result_cache'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('results', sa.Column('segments', sa.JSON(), nullable=True))
+    op.add_column('result_cache', sa.Column('segments', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('result_cache', 'segments')
+    op.drop_column('results', 'segments')
@@ -0,0 +1,21 @@
+from alembic import op
+
+
+revision = '0004_job_list_indexes'
+down_revision = '0003_result_segments'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # keyset paging of GET /api/jobs: unfiltered and status-filtered pages
+    op.create_index('ix_jobs_user_id_id', 'jobs', ['user_id', 'id'])
+    op.create_index('ix_jobs_user_id_status_id', 'jobs', ['user_id', 'status', 'id'])
+    # latest result per job
+    op.create_index('ix_results_job_id_id', 'results', ['job_id', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_results_job_id_id', table_name='results')
+    op.drop_index('ix_jobs_user_id_status_id', table_name='jobs')
+    op.drop_index('ix_jobs_user_id_id', table_name='jobs')
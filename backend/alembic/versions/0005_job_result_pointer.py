@@ -0,0 +1,24 @@
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0005_job_result_pointer'
+down_revision = '0004_job_list_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('jobs') as batch:
+        batch.add_column(sa.Column('result_id', sa.Integer(), nullable=True))
+        batch.create_foreign_key('fk_jobs_result_id', 'results', ['result_id'], ['id'])
+    # point existing jobs at their latest result
+    op.execute(
+        "UPDATE jobs SET result_id = (SELECT max(results.id) FROM results WHERE results.job_id = jobs.id)"
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('jobs') as batch:
+        batch.drop_constraint('fk_jobs_result_id', type_='foreignkey')
+        batch.drop_column('result_id')
@@ -0,0 +1,88 @@
+import ast
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+
+
+revision = '0006_structured_features'
+down_revision = '0005_job_result_pointer'
+branch_labels = None
+depends_on = None
+
+_TABLES = ('results', 'result_cache')
+_CHUNK = 1000
+_features_type = sa.JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), 'postgresql')
+
+
+def _parse_features(text):
+    # rows were written as str(dict) of feature name -> float
+    try:
+        value = ast.literal_eval(text) if text else None
+    except (ValueError, SyntaxError):
+        return None
+    if not isinstance(value, dict):
+        return None
+    return {str(k): float(v) for k, v in value.items() if isinstance(v, (int, float))}
+
+
+def _parse_language(summary):
+    if summary and summary.startswith('lang='):
+        return summary[len('lang='):].split()[0][:16] or None
+    return None
+
+
+def _convert(name, select_cols, convert, update_cols):
+    # Python-side conversion in id-ordered chunks; the old text format is not
+    # parseable in SQL
+    bind = op.get_bind()
+    table = sa.table(name, sa.column('id', sa.Integer), *select_cols, *update_cols)
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(table.c.id, *(table.c[c.name] for c in select_cols))
+            .where(table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(_CHUNK)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        updates = [dict(convert(row), row_id=row.id) for row in rows]
+        bind.execute(
+            table.update()
+            .where(table.c.id == sa.bindparam('row_id'))
+            .values({c.name: sa.bindparam(c.name) for c in update_cols}),
+            updates,
+        )
+
+
+def upgrade() -> None:
+    for name in _TABLES:
+        op.add_column(name, sa.Column('language', sa.String(16), nullable=True))
+        op.add_column(name, sa.Column('features', _features_type, nullable=True))
+        _convert(
+            name,
+            [sa.column('summary', sa.Text), sa.column('feature_summary', sa.Text)],
+            lambda row: {
+                'language': _parse_language(row.summary),
+                'features': _parse_features(row.feature_summary),
+            },
+            [sa.column('language', sa.String), sa.column('features', _features_type)],
+        )
+        with op.batch_alter_table(name) as batch:
+            batch.drop_column('feature_summary')
+
+
+def downgrade() -> None:
+    for name in _TABLES:
+        op.add_column(name, sa.Column('feature_summary', sa.Text(), nullable=True))
+        _convert(
+            name,
+            [sa.column('features', _features_type)],
+            lambda row: {'feature_summary': str(row.features) if row.features is not None else None},
+            [sa.column('feature_summary', sa.Text)],
+        )
+        with op.batch_alter_table(name) as batch:
+            batch.drop_column('features')
+            batch.drop_column('language')
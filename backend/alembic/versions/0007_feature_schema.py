@@ -0,0 +1,21 @@
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0007_feature_schema'
+down_revision = '0006_structured_features'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # existing rows stay NULL: their features were stored rounded, so they are
+    # never reused as model inputs
+    op.add_column('results', sa.Column('feature_schema', sa.String(16), nullable=True))
+    op.add_column('result_cache', sa.Column('feature_schema', sa.String(16), nullable=True))
+
+
+def downgrade() -> None:
+    for name in ('result_cache', 'results'):
+        with op.batch_alter_table(name) as batch:
+            batch.drop_column('feature_schema')
@@ -0,0 +1,31 @@
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0008_model_versions'
+down_revision = '0007_feature_schema'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('results', sa.Column('model_version', sa.String(64), nullable=True))
+    for name in ('results', 'result_cache'):
+        op.add_column(name, sa.Column('shadow_probability', sa.Float(), nullable=True))
+        op.add_column(name, sa.Column('shadow_model_version', sa.String(64), nullable=True))
+    # cache keys pair the primary and shadow versions while a shadow model runs
+    with op.batch_alter_table('result_cache') as batch:
+        batch.alter_column('model_version', type_=sa.String(160), existing_nullable=False)
+
+
+def downgrade() -> None:
+    # cache rows are disposable; combined keys would not fit the old width
+    op.execute(sa.text('DELETE FROM result_cache WHERE length(model_version) > 64'))
+    with op.batch_alter_table('result_cache') as batch:
+        batch.alter_column('model_version', type_=sa.String(64), existing_nullable=False)
+        batch.drop_column('shadow_model_version')
+        batch.drop_column('shadow_probability')
+    with op.batch_alter_table('results') as batch:
+        batch.drop_column('shadow_model_version')
+        batch.drop_column('shadow_probability')
+        batch.drop_column('model_version')
@@ -1,18 +1,40 @@
+import asyncio
+import json
 import uuid
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import insert, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..services.auth import auth_dependency
-from ..services.queue import enqueue_job
-from ..repos.async_session import get_async_session
+from ..config import get_settings
+from ..services.queue import (
+    enqueue_batches_async,
+    enqueue_job_async,
+    enqueue_job_batched_async,
+    enqueue_many_async,
+)
+from ..services.job_events import RESULT_FIELDS, TERMINAL_STATUSES, job_event
+from ..services.storage import upload_fileobj
+from ..repos.async_session import get_async_session, get_session_maker
 from ..repos.models import User, Document, Job, Result
 
 router = APIRouter(prefix="/jobs")
 
 
+async def _get_or_create_user(session: AsyncSession, auth: Dict[str, Any]) -> User:
+    uid = auth["uid"]
+    user = (await session.scalars(select(User).where(User.uid == uid))).first()
+    if not user:
+        user = User(uid=uid, email=auth.get("email"))
+        session.add(user)
+        await session.flush()
+    return user
+
+
 @router.post("")
 async def create_job(
     payload: Dict[str, Any],
@@ -24,14 +46,7 @@ async def create_job(
         raise HTTPException(status_code=422, detail="s3_key is required")
     meta = payload.get("meta")
 
-    # upsert user
-    uid = auth["uid"]
-    email = auth.get("email")
-    user = (await session.scalars(select(User).where(User.uid == uid))).first()
-    if not user:
-        user = User(uid=uid, email=email)
-        session.add(user)
-        await session.flush()
+    user = await _get_or_create_user(session, auth)
 
     # create document
     doc = Document(user_id=user.id, s3_key=s3_key)
@@ -44,48 +59,246 @@ async def create_job(
     session.add(job)
     await session.commit()
 
-    enqueue_job(job_uuid)
+    if get_settings().JOB_BATCHING_ENABLED:
+        await enqueue_job_batched_async(job_uuid)
+    else:
+        await enqueue_job_async(job_uuid)
 
     return {"id": job_uuid, "status": "PENDING"}
 
 
+@router.post("/batch")
+async def create_jobs_batch(
+    files: List[UploadFile] = File(...),
+    lang: Optional[str] = Form(None),
+    auth: Dict[str, Any] = Depends(auth_dependency),
+    session: AsyncSession = Depends(get_async_session),
+):
+    settings = get_settings()
+    if len(files) > settings.MAX_BATCH_FILES:
+        raise HTTPException(status_code=413, detail=f"At most {settings.MAX_BATCH_FILES} files per batch")
+    limit = settings.STORAGE_MAX_BYTES
+    for f in files:
+        if limit and f.size is not None and f.size > limit:
+            raise HTTPException(status_code=413, detail=f"{f.filename} exceeds {limit} bytes")
+
+    # stream every file to storage concurrently; uploads are spooled, not held in memory
+    keys = [f"uploads/{auth['uid']}/{uuid.uuid4()}_{f.filename or 'upload.bin'}" for f in files]
+    await asyncio.gather(
+        *(
+            run_in_threadpool(upload_fileobj, key, f.file, f.content_type or "application/octet-stream")
+            for key, f in zip(keys, files)
+        )
+    )
+
+    # one transaction: user upsert plus bulk Document and Job inserts
+    user = await _get_or_create_user(session, auth)
+    doc_ids = (
+        await session.scalars(
+            insert(Document).returning(Document.id, sort_by_parameter_order=True),
+            [{"user_id": user.id, "s3_key": key} for key in keys],
+        )
+    ).all()
+    job_uuids = [str(uuid.uuid4()) for _ in keys]
+    meta = str({"lang": lang}) if lang else None
+    await session.execute(
+        insert(Job),
+        [
+            {"job_uuid": job_uuid, "user_id": user.id, "document_id": doc_id, "status": "PENDING", "meta": meta}
+            for job_uuid, doc_id in zip(job_uuids, doc_ids)
+        ],
+    )
+    await session.commit()
+
+    if settings.JOB_BATCHING_ENABLED:
+        await enqueue_batches_async(job_uuids)
+    else:
+        await enqueue_many_async(job_uuids)
+
+    return [
+        {
+            "id": job_uuid,
+            "document_id": str(doc_id),
+            "filename": f.filename,
+            "size_bytes": f.size,
+            "s3_key": key,
+            "status": "PENDING",
+        }
+        for job_uuid, doc_id, key, f in zip(job_uuids, doc_ids, keys, files)
+    ]
+
+
+def _filename(s3_key: str) -> str:
+    # keys are "uploads/{uid}/{uuid4}_{filename}"
+    name = s3_key.rsplit("/", 1)[-1]
+    return name[37:] if len(name) > 37 and name[36] == "_" else name
+
+
 @router.get("")
 async def list_jobs(
+    cursor: Optional[int] = Query(None, ge=1),
     page: int = Query(1, ge=1),
-    status: Optional[str] = None,
+    page_size: Optional[int] = Query(None, ge=1),
+    status: List[str] = Query([]),
+    q: Optional[str] = None,
+    include_results: bool = False,
     auth: Dict[str, Any] = Depends(auth_dependency),
     session: AsyncSession = Depends(get_async_session),
 ):
-    limit = 20
-    offset = (page - 1) * limit
-    stmt = select(Job).where(Job.user_id == (await session.scalars(select(User.id).where(User.uid == auth["uid"]))).first()).order_by(Job.id.desc()).offset(offset).limit(limit)
-    if status:
-        stmt = select(Job).where(Job.user_id == (await session.scalars(select(User.id).where(User.uid == auth["uid"]))).first(), Job.status == status).order_by(Job.id.desc()).offset(offset).limit(limit)
-    rows = (await session.scalars(stmt)).all()
-    items: List[Dict[str, Any]] = [
-        {"id": j.job_uuid, "status": j.status, "created_at": getattr(j, "created_at", None)} for j in rows
-    ]
-    return {"items": items, "page": page, "status": status}
+    """Newest-first job list in one query.
+
+    Pages are keyset-paginated on ``(user_id, id)``: pass the previous
+    response's ``next_cursor`` as ``cursor``. ``page`` is only honoured
+    without a cursor and still costs an OFFSET. ``status`` may repeat or be
+    comma-separated; ``q`` matches a job id prefix or the filename.
+    """
+    settings = get_settings()
+    limit = min(page_size or settings.JOBS_PAGE_SIZE, settings.JOBS_MAX_PAGE_SIZE)
+    statuses = [part for value in status for part in value.split(",") if part]
+
+    columns = [Job.id, Job.job_uuid, Job.status, Job.created_at, Document.s3_key]
+    if include_results:
+        columns += [Result.probability, Result.latency_ms]
+    stmt = (
+        select(*columns)
+        .join(User, User.id == Job.user_id)
+        .join(Document, Document.id == Job.document_id)
+        .where(User.uid == auth["uid"])
+    )
+    if include_results:
+        stmt = stmt.outerjoin(Result, Result.id == Job.result_id)
+    if statuses:
+        stmt = stmt.where(Job.status.in_(statuses))
+    if q:
+        stmt = stmt.where(
+            or_(Job.job_uuid.startswith(q, autoescape=True), Document.s3_key.icontains(q, autoescape=True))
+        )
+    if cursor:
+        stmt = stmt.where(Job.id < cursor)
+    elif page > 1:
+        stmt = stmt.offset((page - 1) * limit)
+    # one extra row tells whether another page exists
+    rows = (await session.execute(stmt.order_by(Job.id.desc()).limit(limit + 1))).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+
+    items: List[Dict[str, Any]] = []
+    for row in rows:
+        item = {
+            "id": row.job_uuid,
+            "status": row.status,
+            "created_at": row.created_at,
+            "filename": _filename(row.s3_key),
+        }
+        if include_results:
+            item.update({"probability": row.probability, "latency_ms": row.latency_ms})
+        items.append(item)
+    return {
+        "items": items,
+        "page": page,
+        "page_size": limit,
+        "status": statuses,
+        "next_cursor": rows[-1].id if more else None,
+    }
+
+
+async def _job_states(session: AsyncSession, user_id: int, job_id: Optional[str]) -> List[Dict[str, Any]]:
+    """Current state of one job, or of the user's newest in-flight jobs
+    (at most ``JOBS_MAX_PAGE_SIZE``), as events."""
+    if not job_id:
+        rows = await session.execute(
+            select(Job.job_uuid, Job.status)
+            .where(Job.user_id == user_id, Job.status.in_(("PENDING", "RUNNING")))
+            .order_by(Job.id.desc())
+            .limit(get_settings().JOBS_MAX_PAGE_SIZE)
+        )
+        return [job_event(job_uuid, status) for job_uuid, status in rows]
+    row = (
+        await session.execute(
+            select(Job.job_uuid, Job.status, *(getattr(Result, f) for f in RESULT_FIELDS), Result.id)
+            .outerjoin(Result, Result.id == Job.result_id)
+            .where(Job.job_uuid == job_id)
+        )
+    ).first()
+    if not row:
+        return []
+    return [job_event(row.job_uuid, row.status, row._mapping if row.id is not None else None)]
+
+
+def _sse(event: Dict[str, Any]) -> str:
+    return f"event: job\ndata: {json.dumps(event)}\n\n"
+
+
+async def _event_stream(request: Request, user_id: int, job_id: Optional[str]) -> AsyncIterator[str]:
+    keepalive = get_settings().JOB_EVENTS_KEEPALIVE_SECONDS
+    async with request.app.state.job_events.subscribe(user_id) as updates:
+        # subscribed before reading state, so no transition in between is lost;
+        # a short-lived session keeps the stream from pinning a DB connection
+        async with get_session_maker()() as session:
+            current = await _job_states(session, user_id, job_id)
+        for event in current:
+            yield _sse(event)
+        if job_id and current and current[0]["status"] in TERMINAL_STATUSES:
+            return
+        while True:
+            try:
+                event = await asyncio.wait_for(updates.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                yield ": keepalive\n\n"
+                continue
+            if job_id and event.get("id") != job_id:
+                continue
+            yield _sse(event)
+            if job_id and event.get("status") in TERMINAL_STATUSES:
+                return
+
+
+@router.get("/events")
+async def job_events(
+    request: Request,
+    job_id: Optional[str] = None,
+    auth: Dict[str, Any] = Depends(auth_dependency),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Server-Sent Events: current state first, then every status change.
+
+    With ``job_id`` the stream follows that job and ends once it finishes;
+    without it, it covers all of the caller's jobs. Subscribing is read-only:
+    a caller without any jobs yet gets a 404.
+    """
+    user_id = (await session.scalars(select(User.id).where(User.uid == auth["uid"]))).first()
+    if job_id:
+        owner_id = (await session.scalars(select(Job.user_id).where(Job.job_uuid == job_id))).first()
+        if owner_id is None:
+            raise HTTPException(status_code=404, detail="Not found")
+        if owner_id != user_id:
+            raise HTTPException(status_code=403, detail="Forbidden")
+    elif user_id is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    # hand the connection back before the long-lived stream starts
+    await session.close()
+    return StreamingResponse(
+        _event_stream(request, user_id, job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/{job_id}")
 async def get_job(job_id: str, auth: Dict[str, Any] = Depends(auth_dependency), session: AsyncSession = Depends(get_async_session)):
-    j = (await session.scalars(select(Job).where(Job.job_uuid == job_id))).first()
-    if not j:
+    # one lookup on the job_uuid index; owner uid and current result come along
+    row = (
+        await session.execute(
+            select(Job.job_uuid, Job.status, User.uid, *(getattr(Result, f) for f in RESULT_FIELDS), Result.id)
+            .join(User, User.id == Job.user_id)
+            .outerjoin(Result, Result.id == Job.result_id)
+            .where(Job.job_uuid == job_id)
+        )
+    ).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Not found")
-    # Ensure owner
-    user_id = (await session.scalars(select(User.id).where(User.uid == auth["uid"]))).first()
-    if j.user_id != user_id:
+    if row.uid != auth["uid"]:
         raise HTTPException(status_code=403, detail="Forbidden")
-    r = (await session.scalars(select(Result).where(Result.job_id == j.id).order_by(Result.id.desc()))).first()
-    resp = {"id": j.job_uuid, "status": j.status}
-    if r:
-        resp.update({
-            "probability": r.probability,
-            "summary": r.summary,
-            "feature_summary": r.feature_summary,
-            "latency_ms": r.latency_ms,
-        })
-    return resp
-
-
+    return job_event(row.job_uuid, row.status, row._mapping if row.id is not None else None)
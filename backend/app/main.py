@@ -1,7 +1,41 @@
-from fastapi import FastAPI
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request, Response
 from .api.routes import api_router
+from .config import get_settings
+from .repos.db import dispose_engines
+from .services import metrics
+from .services.job_events import JobEventHub
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # one pub/sub connection per process, shared by every event stream
+    app.state.job_events = JobEventHub(queue_size=get_settings().JOB_EVENTS_QUEUE_SIZE)
+    yield
+    await app.state.job_events.close()
+    await dispose_engines()
+
+
+app = FastAPI(title="Lite AI Detect API", lifespan=lifespan)
 
-app = FastAPI(title="Lite AI Detect API")
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # label by route template so /api/jobs/{job_id} is one series
+    route = request.scope.get("route")
+    metrics.HTTP_REQUEST_SECONDS.labels(
+        request.method, getattr(route, "path", "unmatched"), str(response.status_code)
+    ).observe(time.perf_counter() - start)
+    return response
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE_LATEST)
 
 
 @app.get("/health")
@@ -10,5 +44,3 @@ async def health():
 
 
 app.include_router(api_router, prefix="")
-
-
@@ -0,0 +1,185 @@
+import threading
+from typing import Callable, Dict, FrozenSet, List, Mapping, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+
+# Optional scan passes a feature can depend on; token, character, stopword and
+# punctuation counts are always collected.
+NGRAMS = "ngrams"
+SENTENCES = "sentences"
+CAPS = "caps"
+DIGITS = "digits"
+ALL_NEEDS: FrozenSet[str] = frozenset({NGRAMS, SENTENCES, CAPS, DIGITS})
+
+# Models without ``feature_schema`` metadata were trained on version 1
+DEFAULT_SCHEMA = "1"
+
+
+class ScanCounts(NamedTuple):
+    """Raw per-document statistics; features are ratios over these.
+
+    Fields whose pass was not requested are left at zero.
+    """
+
+    token_count: int
+    unique_tokens: int
+    token_chars: int
+    punct_count: int
+    char_count: int
+    stop_count: int
+    mean_sent_len: float = 0.0
+    std_sent_len: float = 0.0
+    unique_bigrams: int = 0
+    unique_trigrams: int = 0
+    caps: int = 0
+    digit_tokens: int = 0
+
+
+class FeatureSpec(NamedTuple):
+    """One model input: ``extract`` maps scan counts to its value.
+
+    A spec is identified by ``name`` and ``version``; changing what an
+    extractor computes means registering a new version, never editing one.
+    """
+
+    name: str
+    version: int
+    extract: Callable[[ScanCounts], float]
+    needs: FrozenSet[str] = frozenset()
+    dtype: str = "float32"
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}@{self.version}"
+
+
+def _per_token(count: int, c: ScanCounts) -> float:
+    return float(count / c.token_count) if c.token_count else 0.0
+
+
+_FEATURES: Dict[str, FeatureSpec] = {}
+_SCHEMAS: Dict[str, Sequence[str]] = {}
+_built: Dict[str, "FeatureSchema"] = {}
+_lock = threading.Lock()
+
+
+def register_feature(spec: FeatureSpec) -> FeatureSpec:
+    existing = _FEATURES.get(spec.key)
+    if existing is not None and existing != spec:
+        raise ValueError(f"feature {spec.key} is already registered")
+    _FEATURES[spec.key] = spec
+    return spec
+
+
+def register_schema(version: str, keys: Sequence[str]) -> None:
+    """Declare schema ``version`` as the ordered feature ``keys`` (``name@version``)."""
+    unknown = [k for k in keys if k not in _FEATURES]
+    if unknown:
+        raise ValueError(f"schema {version}: unknown features {unknown}")
+    if len({k.split("@")[0] for k in keys}) != len(keys):
+        raise ValueError(f"schema {version}: feature names must be unique")
+    if version in _SCHEMAS and tuple(_SCHEMAS[version]) != tuple(keys):
+        raise ValueError(f"schema {version} is already registered")
+    _SCHEMAS[version] = tuple(keys)
+
+
+class FeatureSchema:
+    """An ordered set of feature specs: the input signature of a model."""
+
+    def __init__(self, version: str, specs: Sequence[FeatureSpec]) -> None:
+        self.version = version
+        self.specs = tuple(specs)
+        self.names = tuple(s.name for s in self.specs)
+        self.keys = frozenset(s.key for s in self.specs)
+        self.needs: FrozenSet[str] = frozenset().union(*(s.needs for s in self.specs))
+        self.dtype = np.result_type(*(np.dtype(s.dtype) for s in self.specs))
+
+    def __len__(self) -> int:
+        return len(self.specs)
+
+    def values(self, counts: ScanCounts, known: Optional[Mapping[str, float]] = None) -> List[float]:
+        if not known:
+            return [s.extract(counts) for s in self.specs]
+        return [known[s.name] if s.name in known else s.extract(counts) for s in self.specs]
+
+    def missing_needs(self, known: Optional[Mapping[str, float]] = None) -> Optional[FrozenSet[str]]:
+        """Scan passes required for the features not in ``known``; None if nothing is left to compute."""
+        todo = [s for s in self.specs if not known or s.name not in known]
+        if not todo:
+            return None
+        return frozenset().union(*(s.needs for s in todo))
+
+    def summary(self, row: np.ndarray) -> Dict[str, float]:
+        # str() of a float32 is its shortest round-tripping form, so stored
+        # values can be fed back to the model bit for bit
+        return {name: float(str(v)) for name, v in zip(self.names, row)}
+
+    def reusable(self, version: Optional[str], features: Optional[Mapping[str, float]]) -> Dict[str, float]:
+        """Values from features stored under schema ``version`` that this schema can use unchanged."""
+        if not version or not features or version not in _SCHEMAS:
+            return {}
+        if version == self.version:
+            shared = self.keys
+        else:
+            shared = self.keys & get_schema(version).keys
+        return {s.name: float(features[s.name]) for s in self.specs if s.key in shared and s.name in features}
+
+
+def get_schema(version: str = DEFAULT_SCHEMA) -> FeatureSchema:
+    with _lock:
+        schema = _built.get(version)
+        if schema is None:
+            if version not in _SCHEMAS:
+                raise ValueError(f"unknown feature schema {version!r}; choose from {sorted(_SCHEMAS)}")
+            schema = _built[version] = FeatureSchema(version, [_FEATURES[k] for k in _SCHEMAS[version]])
+        return schema
+
+
+def _ratio(name: str, version: int, fn: Callable[[ScanCounts], float], *needs: str) -> str:
+    return register_feature(FeatureSpec(name, version, fn, frozenset(needs))).key
+
+
+_BASE = [
+    _ratio("avg_word_len", 1, lambda c: _per_token(c.token_chars, c)),
+    _ratio("ttr", 1, lambda c: _per_token(c.unique_tokens, c)),
+    _ratio("punct_ratio", 1, lambda c: float(c.punct_count / (c.char_count or 1))),
+    _ratio("stop_ratio", 1, lambda c: _per_token(c.stop_count, c)),
+    _ratio("mean_sent_len", 1, lambda c: c.mean_sent_len, SENTENCES),
+    _ratio("std_sent_len", 1, lambda c: c.std_sent_len, SENTENCES),
+    # n-gram sparsity (unique ngrams / total ngrams) for bi/tri
+    _ratio(
+        "bigram_sparsity",
+        1,
+        lambda c: float(c.unique_bigrams / (c.token_count - 1)) if c.token_count > 1 else 0.0,
+        NGRAMS,
+    ),
+    _ratio(
+        "trigram_sparsity",
+        1,
+        lambda c: float(c.unique_trigrams / (c.token_count - 2)) if c.token_count > 2 else 0.0,
+        NGRAMS,
+    ),
+]
+
+# Version 1 measured case on lowercased tokens and digits on letter-only
+# tokens, so both were always 0; kept as constants for models trained on them.
+register_schema(
+    "1",
+    _BASE + [_ratio("caps_ratio", 1, lambda c: 0.0), _ratio("digit_ratio", 1, lambda c: 0.0)],
+)
+register_schema(
+    "2",
+    _BASE
+    + [
+        # share of word tokens written with a leading capital
+        _ratio("caps_ratio", 2, lambda c: _per_token(c.caps, c), CAPS),
+        # share of numbers among word and number tokens
+        _ratio(
+            "digit_ratio",
+            2,
+            lambda c: float(c.digit_tokens / (c.token_count + c.digit_tokens)) if c.digit_tokens else 0.0,
+            DIGITS,
+        ),
+    ],
+)
@@ -1,16 +1,21 @@
 from __future__ import annotations
 
+import hashlib
 import math
 import re
+from fractions import Fraction
 from statistics import mean, pstdev
-from typing import List, Tuple
+from typing import Dict, FrozenSet, List, Mapping, Optional, Sequence, Set, Tuple
 
 import numpy as np
 
+from .feature_schema import ALL_NEEDS, CAPS, DIGITS, NGRAMS, SENTENCES, FeatureSchema, ScanCounts, get_schema
+
 
 _WORD_RE = re.compile(r"[A-Za-z']+")
 _SENT_RE = re.compile(r"[^.!?]+[.!?]?")
 _PUNCT_RE = re.compile(r"[\.,;:!\?\-\(\)\[\]\{\}\"']")
+_DIGIT_RE = re.compile(r"[0-9]+")
 
 _STOPWORDS = {
     "the",
@@ -52,77 +57,535 @@ def _sentences(text: str) -> List[str]:
     return sents or [text.strip()] if text.strip() else []
 
 
-def _ngrams(tokens: List[str], n: int) -> List[Tuple[str, ...]]:
-    return [tuple(tokens[i : i + n]) for i in range(len(tokens) - n + 1)]
-
-
-def extract_features(text: str) -> Tuple[np.ndarray, dict]:
-    tokens = _tokenize(text)
-    token_count = len(tokens)
-    unique_tokens = len(set(tokens)) if tokens else 0
-
-    avg_word_len = float(sum(len(t) for t in tokens) / token_count) if token_count else 0.0
-    type_token_ratio = float(unique_tokens / token_count) if token_count else 0.0
-
-    punct_count = len(_PUNCT_RE.findall(text))
-    char_count = len(text) or 1
-    punct_ratio = float(punct_count / char_count)
-
-    stop_count = sum(1 for t in tokens if t in _STOPWORDS)
-    stop_ratio = float(stop_count / token_count) if token_count else 0.0
-
-    # Sentence stats
-    sents = _sentences(text)
-    sent_lens = [len(_tokenize(s)) for s in sents] or [0]
-    mean_sent_len = float(mean(sent_lens))
-    std_sent_len = float(pstdev(sent_lens)) if len(sent_lens) > 1 else 0.0
-
-    # n-gram sparsity (unique ngrams / total ngrams) for bi/tri
-    def sparsity(n: int) -> float:
-        ngrams = _ngrams(tokens, n)
-        total = len(ngrams)
-        return float(len(set(ngrams)) / total) if total else 0.0
-
-    bigram_sparsity = sparsity(2)
-    trigram_sparsity = sparsity(3)
-
-    # case ratio: proportion of capitalized tokens
-    caps = sum(1 for t in tokens if t[:1].isupper())
-    caps_ratio = float(caps / token_count) if token_count else 0.0
-
-    # digits ratio: tokens that are numeric
-    digit_tokens = sum(1 for t in tokens if t.isdigit())
-    digit_ratio = float(digit_tokens / token_count) if token_count else 0.0
-
-    vect = np.array(
-        [
-            avg_word_len,
-            type_token_ratio,
-            punct_ratio,
-            stop_ratio,
-            mean_sent_len,
-            std_sent_len,
-            bigram_sparsity,
-            trigram_sparsity,
-            caps_ratio,
-            digit_ratio,
-        ],
-        dtype=np.float32,
-    ).reshape(1, -1)
-
-    summary = {
-        "avg_word_len": round(avg_word_len, 4),
-        "ttr": round(type_token_ratio, 4),
-        "punct_ratio": round(punct_ratio, 4),
-        "stop_ratio": round(stop_ratio, 4),
-        "mean_sent_len": round(mean_sent_len, 4),
-        "std_sent_len": round(std_sent_len, 4),
-        "bigram_sparsity": round(bigram_sparsity, 4),
-        "trigram_sparsity": round(trigram_sparsity, 4),
-        "caps_ratio": round(caps_ratio, 4),
-        "digit_ratio": round(digit_ratio, 4),
-    }
-
-    return vect, summary
+_PUNCT_CHARS = ".,;:!?-()[]{}\"'"
+
+# input names of the default feature schema
+FEATURE_NAMES = get_schema().names
+
+_STREAM_RE = re.compile(r"[A-Za-z']+|[0-9]+|[.!?]")
+_TERMINATORS = frozenset(".!?")
+_MASK64 = (1 << 64) - 1
+
+
+def _splitmix64(x: int) -> int:
+    x = (x + 0x9E3779B97F4A7C15) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+
+def _mix64(key: int) -> int:
+    """64-bit hash of a non-negative int of any width, chained over 64-bit limbs."""
+    h = _splitmix64(key & _MASK64)
+    key >>= 64
+    while key:
+        h = _splitmix64(h ^ (key & _MASK64))
+        key >>= 64
+    return h
+
+
+class _HyperLogLog:
+    def __init__(self, p: int = 14) -> None:
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+
+    def add(self, h: int) -> None:
+        idx = h >> (64 - self.p)
+        rest = (h << self.p) & _MASK64
+        rank = 64 - rest.bit_length() + 1 if rest else 64 - self.p + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def count(self) -> float:
+        m = self.m
+        est = (0.7213 / (1 + 1.079 / m)) * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if est <= 2.5 * m and zeros:
+            return m * math.log(m / zeros)
+        return est
+
+
+class _DistinctCounter:
+    """Exact distinct count up to ``limit`` keys, then a HyperLogLog estimate."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self._exact: Optional[Set[int]] = set()
+        self._hll: Optional[_HyperLogLog] = None
+
+    def add(self, key: int) -> None:
+        if self._exact is not None:
+            self._exact.add(key)
+            if len(self._exact) > self.limit:
+                self._hll = _HyperLogLog()
+                for k in self._exact:
+                    self._hll.add(_mix64(k))
+                self._exact = None
+        else:
+            self._hll.add(_mix64(key))  # type: ignore[union-attr]
+
+    @property
+    def exact(self) -> bool:
+        return self._exact is not None
+
+    def __len__(self) -> int:
+        if self._exact is not None:
+            return len(self._exact)
+        return int(round(self._hll.count()))  # type: ignore[union-attr]
+
+
+class FeatureAccumulator:
+    """Streaming feature extractor fed with text chunks of any size.
+
+    Tokens and sentences may be split across ``update`` calls. Memory is
+    bounded: distinct tokens and n-grams are counted exactly up to
+    ``exact_limit`` keys and estimated with HyperLogLog beyond that, and
+    sentence lengths are kept as exact running sums. Below the limit
+    ``finalize`` returns exactly what ``extract_features`` returns for the
+    joined text under the same ``schema``.
+    """
+
+    def __init__(self, exact_limit: int = 250_000, schema: Optional[FeatureSchema] = None) -> None:
+        self.exact_limit = exact_limit
+        self.schema = schema or get_schema()
+        self._vocab: Dict[str, int] = {}
+        self._types: Optional[_HyperLogLog] = None
+        self._bigrams = _DistinctCounter(exact_limit)
+        self._trigrams = _DistinctCounter(exact_limit)
+        self._prev1 = -1
+        self._prev2 = -1
+        self._carry = ""
+        self._chars = 0
+        self._punct = 0
+        self._tokens = 0
+        self._token_chars = 0
+        self._stop = 0
+        self._caps = 0
+        self._digits = 0
+        # sentence state: length sums and the open segment
+        self._sent_n = 0
+        self._sent_sum = 0
+        self._sent_sq = 0
+        self._seg_tokens = 0
+        self._seg_open = False
+        self._seg_nonblank = False
+
+    def _token_id(self, tok: str) -> int:
+        tid = self._vocab.get(tok)
+        if tid is not None:
+            return tid
+        if self._types is None and len(self._vocab) < self.exact_limit:
+            tid = self._vocab[tok] = len(self._vocab)
+            return tid
+        if self._types is None:
+            self._types = _HyperLogLog()
+            for known in self._vocab.values():
+                self._types.add(_mix64(known))
+        # ids past the limit come from a stable hash of the token (``hash`` is
+        # salted per process), offset clear of exact ids
+        tid = self.exact_limit + int.from_bytes(hashlib.blake2b(tok.encode(), digest_size=8).digest(), "little")
+        self._types.add(_mix64(tid))
+        return tid
+
+    def _add_token(self, raw: str) -> None:
+        tok = raw.lower()
+        tid = self._token_id(tok)
+        if self._prev1 >= 0:
+            self._bigrams.add((self._prev1 << 64) | tid)
+            if self._prev2 >= 0:
+                self._trigrams.add((self._prev2 << 128) | (self._prev1 << 64) | tid)
+        self._prev2, self._prev1 = self._prev1, tid
+        self._tokens += 1
+        self._seg_tokens += 1
+        self._token_chars += len(tok)
+        if tok in _STOPWORDS:
+            self._stop += 1
+        if raw[0].isupper():
+            self._caps += 1
+
+    def _add_number(self) -> None:
+        self._seg_open = self._seg_nonblank = True
+        self._digits += 1
+
+    def _close_sentence(self) -> None:
+        n = self._seg_tokens
+        self._sent_n += 1
+        self._sent_sum += n
+        self._sent_sq += n * n
+        self._seg_tokens = 0
+        self._seg_open = False
+        self._seg_nonblank = False
+
+    def _gap(self, buf: str, start: int, end: int) -> None:
+        # non-terminator characters between matches: they open a segment
+        if end > start:
+            self._seg_open = True
+            if not self._seg_nonblank and not buf[start:end].isspace():
+                self._seg_nonblank = True
+
+    def update(self, chunk: str) -> None:
+        if not chunk:
+            return
+        self._chars += len(chunk)
+        self._punct += sum(chunk.count(c) for c in _PUNCT_CHARS)
+        buf = self._carry + chunk
+        self._carry = ""
+        pos = 0
+        end = len(buf)
+        for m in _STREAM_RE.finditer(buf):
+            start = m.start()
+            self._gap(buf, pos, start)
+            pos = m.end()
+            tok = m.group(0)
+            if tok in _TERMINATORS:
+                if self._seg_open:
+                    self._close_sentence()
+            elif pos == end:
+                # may continue in the next chunk
+                self._carry = tok
+            elif tok[0].isdigit():
+                self._add_number()
+            else:
+                self._seg_open = self._seg_nonblank = True
+                self._add_token(tok)
+        self._gap(buf, pos, end - len(self._carry))
+
+    def finalize(self, schema: Optional[FeatureSchema] = None) -> Tuple[np.ndarray, dict]:
+        """The ``(1, F)`` row and summary of everything fed so far, under
+        ``schema`` (default: the accumulator's). May be called once per schema."""
+        schema = schema or self.schema
+        vect = np.array(schema.values(self._counts()), dtype=schema.dtype).reshape(1, -1)
+        return vect, schema.summary(vect[0])
+
+    def _counts(self) -> ScanCounts:
+        if self._carry:
+            if self._carry[0].isdigit():
+                self._add_number()
+            else:
+                self._seg_open = self._seg_nonblank = True
+                self._add_token(self._carry)
+            self._carry = ""
+        if self._seg_open and self._seg_nonblank:
+            self._close_sentence()
+
+        # A non-blank text with no sentence spans counts as one empty sentence,
+        # as does an empty text (see ``_sentences``).
+        if self._sent_n == 0:
+            mean_sent_len, std_sent_len = 0.0, 0.0
+        else:
+            mean_sent_len, std_sent_len = _sent_moments(self._sent_n, self._sent_sum, self._sent_sq)
+
+        return ScanCounts(
+            token_count=self._tokens,
+            unique_tokens=len(self._vocab) if self._types is None else int(round(self._types.count())),
+            token_chars=self._token_chars,
+            punct_count=self._punct,
+            char_count=self._chars,
+            stop_count=self._stop,
+            mean_sent_len=mean_sent_len,
+            std_sent_len=std_sent_len,
+            unique_bigrams=len(self._bigrams),
+            unique_trigrams=len(self._trigrams),
+            caps=self._caps,
+            digit_tokens=self._digits,
+        )
+
+
+def _sqrt_frac(num: int, den: int) -> float:
+    """Correctly rounded ``sqrt(num / den)``, as ``statistics.pstdev`` computes it."""
+    q = (num.bit_length() - den.bit_length() - 109) // 2
+    if q >= 0:
+        root = math.isqrt(num // (den << 2 * q))
+        root |= root * root * (den << 2 * q) != num
+        return (root << q) / 1
+    root = math.isqrt((num << -2 * q) // den)
+    root |= root * root * den != num << -2 * q
+    return root / (1 << -q)
+
+
+def _sent_moments(n: int, total: int, total_sq: int) -> Tuple[float, float]:
+    """Mean and population std of ``n`` sentence lengths from their sums.
+
+    Bit-identical to ``statistics.mean`` / ``pstdev`` over the lengths, which
+    are exact and correctly rounded, without materialising the list.
+    """
+    mean_len = float(Fraction(total, n))
+    if n < 2:
+        return mean_len, 0.0
+    return mean_len, _sqrt_frac(n * total_sq - total * total, n * n)
+
+
+# ASCII fast path: byte classes by lookup table
+def _byte_lut(chars: bytes) -> np.ndarray:
+    lut = np.zeros(256, dtype=bool)
+    lut[list(chars)] = True
+    return lut
+
+
+_WORD_LUT = _byte_lut(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'")
+_TERM_LUT = _byte_lut(b".!?")
+_PUNCT_LUT = _byte_lut(_PUNCT_CHARS.encode())
+# whitespace as ``str.strip`` sees it, within ASCII
+_SPACE_LUT = _byte_lut(b" \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f")
+_LOWER_LUT = np.arange(256, dtype=np.uint8)
+_LOWER_LUT[ord("A") : ord("Z") + 1] += 32
+_STOPWORDS_BY_LEN = {
+    n: np.array(sorted(w.encode() for w in _STOPWORDS if len(w) == n), dtype=f"S{n}")
+    for n in {len(w) for w in _STOPWORDS}
+}
+# below this size the regex scan is as fast as the array setup
+_ASCII_MIN_CHARS = 2048
+
+
+def _runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Start and end offsets of the runs of True in ``mask``."""
+    edges = np.diff(mask.view(np.int8), prepend=np.int8(0), append=np.int8(0))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+_UPPER_LUT = _byte_lut(b"ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+_DIGIT_LUT = _byte_lut(b"0123456789")
+
+
+def _scan_ascii(text: str, needs: FrozenSet[str] = ALL_NEEDS) -> ScanCounts:
+    """``_scan`` for ASCII text over a byte array, without per-token strings.
+
+    Token and sentence boundaries come from run edges of lookup-table classes.
+    Tokens are grouped by length and deduplicated as fixed-width byte strings
+    to get per-document ids; n-grams are counted as packed id pairs, the
+    trigram key reusing the bigram's rank.
+    """
+    buf = np.frombuffer(text.encode("ascii"), dtype=np.uint8)
+    starts, ends = _runs(_WORD_LUT[buf])
+    lens = ends - starts
+    token_count = int(starts.size)
+
+    ids = np.empty(token_count, dtype=np.int64)
+    lower = _LOWER_LUT[buf]
+    vocab_size = 0
+    stop_count = 0
+    for width in np.unique(lens).tolist():
+        members = np.flatnonzero(lens == width)
+        words = lower[starts[members, None] + np.arange(width)].view(f"S{width}").ravel()
+        uniq, inverse = np.unique(words, return_inverse=True)
+        ids[members] = inverse + vocab_size
+        vocab_size += int(uniq.size)
+        stops = _STOPWORDS_BY_LEN.get(width)
+        if stops is not None:
+            stop_count += int(np.bincount(inverse, minlength=uniq.size)[np.isin(uniq, stops)].sum())
+
+    unique_bigrams = unique_trigrams = 0
+    if NGRAMS in needs and token_count > 1:
+        bigram_keys, bigram_rank = np.unique(ids[:-1] * vocab_size + ids[1:], return_inverse=True)
+        unique_bigrams = int(bigram_keys.size)
+        if token_count > 2:
+            unique_trigrams = int(np.unique(bigram_rank[:-1] * vocab_size + ids[2:]).size)
+
+    mean_sent_len = std_sent_len = 0.0
+    if SENTENCES in needs:
+        # ``_SENT_RE`` spans are the runs between terminators; a run counts when
+        # it has tokens or is non-blank, and one followed by a terminator never is blank
+        run_starts, run_ends = _runs(~_TERM_LUT[buf])
+        nonspace = np.concatenate(([0], np.cumsum(~_SPACE_LUT[buf])))
+        nonblank = (run_ends < buf.size) | (nonspace[run_ends] > nonspace[run_starts])
+        per_sent = np.searchsorted(starts, run_ends) - np.searchsorted(starts, run_starts)
+        per_sent = per_sent[nonblank | (per_sent > 0)]
+        if per_sent.size:
+            mean_sent_len, std_sent_len = _sent_moments(
+                int(per_sent.size), int(per_sent.sum()), int((per_sent * per_sent).sum())
+            )
+
+    return ScanCounts(
+        token_count=token_count,
+        unique_tokens=vocab_size,
+        token_chars=int(lens.sum()),
+        punct_count=int(np.count_nonzero(_PUNCT_LUT[buf])),
+        char_count=len(text),
+        stop_count=stop_count,
+        mean_sent_len=mean_sent_len,
+        std_sent_len=std_sent_len,
+        unique_bigrams=unique_bigrams,
+        unique_trigrams=unique_trigrams,
+        caps=int(np.count_nonzero(_UPPER_LUT[buf[starts]])) if CAPS in needs else 0,
+        digit_tokens=int(_runs(_DIGIT_LUT[buf])[0].size) if DIGITS in needs else 0,
+    )
+
+
+def _scan(text: str, needs: FrozenSet[str] = ALL_NEEDS) -> ScanCounts:
+    """Compute the scan counts for one document in a single pass.
+
+    Sentences are walked with ``_SENT_RE`` and tokens are matched inside each
+    sentence span, so every token is visited exactly once. Tokens never contain
+    sentence terminators, so this yields the same token stream as ``_tokenize``.
+    N-grams are packed into ints over per-document token ids instead of being
+    materialised as tuple lists. Optional passes not in ``needs`` are skipped.
+    """
+    if len(text) >= _ASCII_MIN_CHARS and text.isascii():
+        return _scan_ascii(text, needs)
+    ngrams = NGRAMS in needs
+    count_caps = CAPS in needs
+    vocab: Dict[str, int] = {}
+    bigrams: Set[int] = set()
+    trigrams: Set[int] = set()
+    sent_lens: List[int] = []
+    token_count = 0
+    char_total = 0
+    stop_count = 0
+    caps = 0
+    prev1 = prev2 = -1
+
+    for sent in _SENT_RE.finditer(text):
+        n_sent = 0
+        for m in _WORD_RE.finditer(text, sent.start(), sent.end()):
+            raw = m.group(0)
+            tok = raw.lower()
+            tid = vocab.setdefault(tok, len(vocab))
+            if ngrams:
+                if prev1 >= 0:
+                    bigrams.add((prev1 << 32) | tid)
+                    if prev2 >= 0:
+                        trigrams.add((prev2 << 64) | (prev1 << 32) | tid)
+                prev2, prev1 = prev1, tid
+            n_sent += 1
+            char_total += len(tok)
+            if tok in _STOPWORDS:
+                stop_count += 1
+            if count_caps and raw[0].isupper():
+                caps += 1
+        if n_sent or sent.group(0).strip():
+            sent_lens.append(n_sent)
+        token_count += n_sent
+
+    mean_sent_len = std_sent_len = 0.0
+    if SENTENCES in needs:
+        # Mirrors ``_sentences``: a non-blank text with no sentence spans is a
+        # single sentence (it only holds terminators, hence no tokens).
+        sent_lens = sent_lens or [0]
+        mean_sent_len = float(mean(sent_lens))
+        std_sent_len = float(pstdev(sent_lens)) if len(sent_lens) > 1 else 0.0
+
+    return ScanCounts(
+        token_count=token_count,
+        unique_tokens=len(vocab),
+        token_chars=char_total,
+        punct_count=sum(text.count(c) for c in _PUNCT_CHARS),
+        char_count=len(text),
+        stop_count=stop_count,
+        mean_sent_len=mean_sent_len,
+        std_sent_len=std_sent_len,
+        unique_bigrams=len(bigrams),
+        unique_trigrams=len(trigrams),
+        caps=caps,
+        digit_tokens=len(_DIGIT_RE.findall(text)) if DIGITS in needs else 0,
+    )
+
+
+def extract_features(
+    text: str, schema: Optional[FeatureSchema] = None, known: Optional[Mapping[str, float]] = None
+) -> Tuple[np.ndarray, dict]:
+    """The ``(1, F)`` input row for ``text`` under ``schema`` and its summary.
+
+    Values in ``known`` (by feature name, e.g. stored under an earlier schema
+    that shares the feature's version) are used as-is; only the passes the
+    remaining features need are run.
+    """
+    schema = schema or get_schema()
+    needs = schema.missing_needs(known)
+    counts = _scan(text, needs) if needs is not None else None
+    vect = np.array(schema.values(counts, known), dtype=schema.dtype).reshape(1, -1)  # type: ignore[arg-type]
+    return vect, schema.summary(vect[0])
+
+
+def extract_features_batch(texts: Sequence[str], schema: Optional[FeatureSchema] = None) -> np.ndarray:
+    """Return the stacked ``(N, F)`` feature matrix for ``texts``.
+
+    Row ``i`` is identical to ``extract_features(texts[i], schema)[0]``.
+    """
+    schema = schema or get_schema()
+    out = np.zeros((len(texts), len(schema)), dtype=schema.dtype)
+    for i, text in enumerate(texts):
+        out[i] = schema.values(_scan(text, schema.needs))
+    return out
+
+
+def extract_window_features(
+    text: str, window_tokens: int, stride_tokens: Optional[int] = None, schema: Optional[FeatureSchema] = None
+) -> Tuple[np.ndarray, List[Tuple[int, int]]]:
+    """Feature rows for fixed-size token windows over ``text``.
+
+    The text is tokenized once; each window reuses that token stream and its
+    sentence membership, so nothing is re-tokenized per slice. A window's
+    sentence lengths count only the window's own tokens, and punctuation is
+    measured over the window's character span. Returns the ``(W, F)`` matrix
+    and each window's ``(start, end)`` character offsets in ``text``.
+    """
+    schema = schema or get_schema()
+    needs = schema.needs
+    stride = stride_tokens or window_tokens
+    toks: List[str] = []
+    capitals: List[bool] = []
+    starts: List[int] = []
+    ends: List[int] = []
+    sent_ids: List[int] = []
+    for sid, sent in enumerate(_SENT_RE.finditer(text)):
+        for m in _WORD_RE.finditer(text, sent.start(), sent.end()):
+            raw = m.group(0)
+            toks.append(raw.lower())
+            capitals.append(raw[0].isupper())
+            starts.append(m.start())
+            ends.append(m.end())
+            sent_ids.append(sid)
+
+    bounds = list(range(0, max(len(toks) - window_tokens, 0) + 1, stride))
+    if toks and bounds[-1] + window_tokens < len(toks):
+        bounds.append(len(toks) - window_tokens)
+
+    out = np.zeros((len(bounds), len(schema)), dtype=schema.dtype)
+    spans: List[Tuple[int, int]] = []
+    for row, lo in enumerate(bounds):
+        hi = min(lo + window_tokens, len(toks))
+        span = (starts[lo], ends[hi - 1]) if hi > lo else (0, len(text))
+        spans.append(span)
 
+        vocab: Dict[str, int] = {}
+        bigrams: Set[int] = set()
+        trigrams: Set[int] = set()
+        sent_lens: List[int] = []
+        char_total = stop_count = 0
+        prev1 = prev2 = prev_sid = -1
+        for i in range(lo, hi):
+            tok = toks[i]
+            tid = vocab.setdefault(tok, len(vocab))
+            if NGRAMS in needs:
+                if prev1 >= 0:
+                    bigrams.add((prev1 << 32) | tid)
+                    if prev2 >= 0:
+                        trigrams.add((prev2 << 64) | (prev1 << 32) | tid)
+                prev2, prev1 = prev1, tid
+            if sent_ids[i] != prev_sid:
+                sent_lens.append(0)
+                prev_sid = sent_ids[i]
+            sent_lens[-1] += 1
+            char_total += len(tok)
+            if tok in _STOPWORDS:
+                stop_count += 1
 
+        segment = text[span[0] : span[1]]
+        sent_lens = sent_lens or [0]
+        counts = ScanCounts(
+            token_count=hi - lo,
+            unique_tokens=len(vocab),
+            token_chars=char_total,
+            punct_count=sum(segment.count(c) for c in _PUNCT_CHARS),
+            char_count=len(segment),
+            stop_count=stop_count,
+            mean_sent_len=float(mean(sent_lens)),
+            std_sent_len=float(pstdev(sent_lens)) if len(sent_lens) > 1 else 0.0,
+            unique_bigrams=len(bigrams),
+            unique_trigrams=len(trigrams),
+            caps=sum(capitals[lo:hi]) if CAPS in needs else 0,
+            digit_tokens=len(_DIGIT_RE.findall(segment)) if DIGITS in needs else 0,
+        )
+        out[row] = schema.values(counts)
+    return out, spans
@@ -0,0 +1,176 @@
+import threading
+from typing import Callable, Dict, List, Protocol, Sequence, Tuple
+
+from ..config import get_settings
+
+
+UNKNOWN = "unknown"
+
+
+class LanguageBackend(Protocol):
+    def detect_batch(self, samples: Sequence[str]) -> List[str]:
+        ...
+
+
+class LangdetectBackend:
+    """langdetect with profiles loaded once and a fixed seed.
+
+    ``langdetect.detect`` shares a lazily built global factory and an unseeded
+    RNG, so the same text can come back with different labels across runs.
+    """
+
+    def __init__(self, seed: int = 0) -> None:
+        from langdetect.detector_factory import PROFILES_DIRECTORY, DetectorFactory
+
+        self._factory = DetectorFactory()
+        self._factory.load_profile(PROFILES_DIRECTORY)
+        self._factory.seed = seed
+
+    def detect_batch(self, samples: Sequence[str]) -> List[str]:
+        from langdetect.lang_detect_exception import LangDetectException
+
+        out = []
+        for sample in samples:
+            detector = self._factory.create()
+            detector.append(sample)
+            try:
+                out.append(detector.detect())
+            except LangDetectException:  # no usable features (digits, symbols)
+                out.append(UNKNOWN)
+        return out
+
+
+_BACKENDS: Dict[str, Callable[[], LanguageBackend]] = {
+    "langdetect": lambda: LangdetectBackend(seed=get_settings().LANGID_SEED),
+}
+_backend: Dict[str, LanguageBackend] = {}
+_lock = threading.Lock()
+
+
+def register_backend(name: str, factory: Callable[[], LanguageBackend]) -> None:
+    """Make ``factory`` selectable with ``LANGID_BACKEND=name``."""
+    _BACKENDS[name] = factory
+
+
+def get_backend() -> LanguageBackend:
+    """The configured backend, built once per process (call before forking)."""
+    name = get_settings().LANGID_BACKEND
+    with _lock:
+        backend = _backend.get(name)
+        if backend is None:
+            if name not in _BACKENDS:
+                raise ValueError(f"unknown LANGID_BACKEND {name!r}; choose from {sorted(_BACKENDS)}")
+            backend = _backend[name] = _BACKENDS[name]()
+        return backend
+
+
+def sample_text(text: str, max_chars: int, pieces: int) -> str:
+    """At most ``max_chars`` of ``text``, taken as ``pieces`` evenly spaced slices.
+
+    Slices start and end on whitespace where possible so words are not cut;
+    a text that already fits is returned unchanged.
+    """
+    if max_chars <= 0 or len(text) <= max_chars:
+        return text
+    pieces = max(1, pieces)
+    width = max_chars // pieces
+    step = (len(text) - width) / max(1, pieces - 1)
+    parts = []
+    for i in range(pieces):
+        start = int(i * step)
+        end = start + width
+        if start:
+            space = text.find(" ", start, end)
+            start = space + 1 if space != -1 else start
+        space = text.rfind(" ", start, end)
+        parts.append(text[start : space if space > start else end])
+    return " ".join(parts)
+
+
+def _trim_to_words(block: str, first: bool) -> str:
+    start = 0
+    if not first:
+        space = block.find(" ")
+        start = space + 1 if space != -1 else 0
+    space = block.rfind(" ", start)
+    return block[start : space if space > start else len(block)]
+
+
+class TextSampler:
+    """``sample_text`` for a text that arrives in chunks, in bounded memory.
+
+    The text is cut into blocks of ``max_chars // pieces`` characters. Every
+    ``stride``-th block is kept, and the stride doubles whenever more than
+    ``2 * pieces`` blocks are held, so at most about ``2 * max_chars``
+    characters are buffered. A text that fits in ``max_chars`` comes back
+    whole, as from ``sample_text``; a longer one yields ``pieces`` evenly
+    spread kept blocks, cut to whole words.
+    """
+
+    def __init__(self, max_chars: int, pieces: int) -> None:
+        self.pieces = max(1, pieces)
+        self.max_chars = max_chars
+        # a non-positive max_chars keeps everything, as sample_text does
+        self.width = max(1, max_chars // self.pieces) if max_chars > 0 else 0
+        self._blocks: List[Tuple[int, str]] = []
+        self._current: List[str] = []
+        self._index = 0
+        self._fill = 0
+        self._stride = 1
+        self._length = 0
+
+    def update(self, chunk: str) -> None:
+        self._length += len(chunk)
+        if not self.width:
+            self._current.append(chunk)
+            return
+        while chunk:
+            part, chunk = chunk[: self.width - self._fill], chunk[self.width - self._fill :]
+            if self._index % self._stride == 0:
+                self._current.append(part)
+            self._fill += len(part)
+            if self._fill == self.width:
+                self._close_block()
+
+    def _close_block(self) -> None:
+        if self._index % self._stride == 0:
+            self._blocks.append((self._index, "".join(self._current)))
+            self._current = []
+        self._index += 1
+        self._fill = 0
+        if len(self._blocks) > 2 * self.pieces:
+            self._stride *= 2
+            self._blocks = [b for b in self._blocks if b[0] % self._stride == 0]
+
+    def sample(self) -> str:
+        blocks = [text for _, text in self._blocks]
+        if self._current:
+            blocks.append("".join(self._current))
+        if not self.width or self._length <= self.max_chars:
+            return "".join(blocks)
+        if len(blocks) <= self.pieces:
+            chosen = list(range(len(blocks)))
+        else:
+            step = (len(blocks) - 1) / max(1, self.pieces - 1)
+            chosen = sorted({round(i * step) for i in range(self.pieces)})
+        return " ".join(_trim_to_words(blocks[i], i == 0) for i in chosen)
+
+
+def detect_languages(texts: Sequence[str]) -> List[str]:
+    """Language code per text; blank texts are ``"unknown"``."""
+    settings = get_settings()
+    return detect_samples([sample_text(t, settings.LANGID_MAX_CHARS, settings.LANGID_SAMPLES) for t in texts])
+
+
+def detect_samples(samples: Sequence[str]) -> List[str]:
+    """``detect_languages`` for texts already sampled, e.g. by ``TextSampler``."""
+    todo = [i for i, s in enumerate(samples) if s.strip()]
+    out = [UNKNOWN] * len(samples)
+    if todo:
+        for i, lang in zip(todo, get_backend().detect_batch([samples[i] for i in todo])):
+            out[i] = lang
+    return out
+
+
+def detect_language(text: str) -> str:
+    return detect_languages([text])[0]
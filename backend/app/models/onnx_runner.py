@@ -1,39 +1,301 @@
 from __future__ import annotations
 
+import hashlib
+import logging
 import os
-from functools import lru_cache
-from typing import Optional
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
 
 import numpy as np
 
+from ..config import get_settings
+from .feature_schema import DEFAULT_SCHEMA, FeatureSchema, get_schema
+
 try:
     import onnxruntime as ort  # type: ignore
 except Exception:  # pragma: no cover - fallback in environments without onnxruntime
     ort = None  # type: ignore
 
 
-@lru_cache(maxsize=1)
-def _get_session() -> Optional["ort.InferenceSession"]:
-    model_path = os.getenv("MODEL_PATH", os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "models", "cnn.onnx")))
-    if ort is None or not os.path.exists(model_path):
+logger = logging.getLogger(__name__)
+
+_GRAPH_OPT_LEVELS = {
+    "disable": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+
+_EXECUTION_MODES = {
+    "sequential": "ORT_SEQUENTIAL",
+    "parallel": "ORT_PARALLEL",
+}
+
+
+def _optimized_model_path(model_path: str, checksum: str) -> str:
+    # keyed by the source checksum: a replaced model never picks up the old
+    # model's graph, whatever the files' mtimes say
+    root, ext = os.path.splitext(model_path)
+    return f"{root}.{checksum.split(':')[-1]}.optimized{ext or '.onnx'}"
+
+
+def _session_options(model_path: str, checksum: str) -> Tuple["ort.SessionOptions", str, Optional[str]]:
+    """Build SessionOptions from Settings and pick the file to load.
+
+    When ``ORT_SAVE_OPTIMIZED_MODEL`` is on and an optimized copy of this exact
+    source model exists, that copy is loaded with optimization disabled.
+    Otherwise onnxruntime writes the optimized graph to a per-process temporary
+    file, returned third, for ``load_model`` to rename into place.
+    """
+    settings = get_settings()
+    so = ort.SessionOptions()  # type: ignore[union-attr]
+    if settings.ORT_INTRA_OP_THREADS > 0:
+        so.intra_op_num_threads = settings.ORT_INTRA_OP_THREADS
+    if settings.ORT_INTER_OP_THREADS > 0:
+        so.inter_op_num_threads = settings.ORT_INTER_OP_THREADS
+    level = _GRAPH_OPT_LEVELS.get(settings.ORT_GRAPH_OPTIMIZATION_LEVEL.lower(), "ORT_ENABLE_ALL")
+    so.graph_optimization_level = getattr(ort.GraphOptimizationLevel, level)  # type: ignore[union-attr]
+    mode = _EXECUTION_MODES.get(settings.ORT_EXECUTION_MODE.lower(), "ORT_SEQUENTIAL")
+    so.execution_mode = getattr(ort.ExecutionMode, mode)  # type: ignore[union-attr]
+
+    if settings.ORT_SAVE_OPTIMIZED_MODEL:
+        opt_path = _optimized_model_path(model_path, checksum)
+        if os.path.exists(opt_path):
+            so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL  # type: ignore[union-attr]
+            return so, opt_path, None
+        root, ext = os.path.splitext(opt_path)
+        # concurrent workers each write their own copy; the rename is atomic
+        so.optimized_model_filepath = f"{root}.tmp{os.getpid()}{ext}"
+    return so, model_path, so.optimized_model_filepath or None
+
+
+def _model_path() -> str:
+    return os.getenv("MODEL_PATH", os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "models", "cnn.onnx")))
+
+
+def file_checksum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return f"sha256:{digest.hexdigest()[:16]}"
+
+
+def _fallback_predict(features: np.ndarray) -> np.ndarray:
+    # Deterministic lightweight fallback: logistic of each row's feature mean
+    x = np.clip(features.mean(axis=1).astype(np.float64), 0.0, 10.0)
+    return 1.0 / (1.0 + np.exp(-x + 2.0))
+
+
+class LoadedModel:
+    """One loaded version of a named model.
+
+    Immutable: a caller holding it keeps scoring with this version after the
+    registry has swapped in a newer one, so a batch never mixes versions.
+    """
+
+    __slots__ = ("name", "version", "schema", "checksum", "_predict")
+
+    def __init__(
+        self,
+        name: str,
+        version: str,
+        schema: FeatureSchema,
+        predict: Callable[[np.ndarray], np.ndarray],
+        checksum: Optional[str] = None,
+    ) -> None:
+        self.name = name
+        self.version = version
+        self.schema = schema
+        self.checksum = checksum
+        self._predict = predict
+
+    def infer_batch(self, features: np.ndarray) -> np.ndarray:
+        """Score an ``(N, F)`` feature matrix and return ``N`` probabilities."""
+        features = np.asarray(features, dtype=np.float32).reshape(len(features), -1)
+        if not len(features):
+            return np.zeros(0)
+        # assume output is probability shape (N, 1) or (N,)
+        prob = np.asarray(self._predict(features)).reshape(len(features), -1)[:, 0].astype(np.float64)
+        return np.clip(prob, 0.0, 1.0)
+
+
+def _session_schema(sess: "ort.InferenceSession") -> FeatureSchema:
+    """The feature schema the model was trained on.
+
+    Read from the model's ``feature_schema`` metadata property, written when it
+    is exported; models without it use schema 1.
+    """
+    version = sess.get_modelmeta().custom_metadata_map.get("feature_schema", DEFAULT_SCHEMA)
+    schema = get_schema(version)
+    width = sess.get_inputs()[0].shape[-1]
+    if isinstance(width, int) and width > 0 and width != len(schema):
+        raise ValueError(f"model takes {width} features but feature schema {version} has {len(schema)}")
+    return schema
+
+
+def load_model(name: str, path: str, version: str = "") -> LoadedModel:
+    """Load ``path`` as model ``name``, versioned by the file checksum.
+
+    A ``version`` label is prefixed (``label@sha256:...``), so each new file
+    still gets a new version. Without onnxruntime or the file, this is the
+    deterministic fallback model.
+    """
+    if ort is None or not os.path.exists(path):
+        return LoadedModel(name, version or "fallback", get_schema(), _fallback_predict)
+    checksum = file_checksum(path)
+    so, load_path, tmp_path = _session_options(path, checksum)
+    try:
+        sess = ort.InferenceSession(load_path, sess_options=so, providers=["CPUExecutionProvider"])  # type: ignore
+        if tmp_path and os.path.exists(tmp_path):
+            os.replace(tmp_path, _optimized_model_path(path, checksum))
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    input_name, output_name = sess.get_inputs()[0].name, sess.get_outputs()[0].name
+
+    def predict(features: np.ndarray) -> np.ndarray:
+        return sess.run([output_name], {input_name: features})[0]
+
+    version = f"{version}@{checksum}" if version else checksum
+    return LoadedModel(name, version, _session_schema(sess), predict, checksum)
+
+
+def _stat_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
         return None
-    sess = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])  # type: ignore
-    return sess
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+class ModelRegistry:
+    """Named models, each hot-swapped when its file's checksum changes.
+
+    ``get`` checks a model's file at most every ``MODEL_RELOAD_INTERVAL_SECONDS``
+    (0 loads once): a cheap stat first, the checksum only when the stat moved,
+    and a new session only when the checksum differs. The new version replaces
+    the old one in a single assignment. A file that fails to load (say, caught
+    mid-copy) keeps the old version serving and is retried at the next check.
+    Deploy by writing the new file elsewhere and renaming it over the old one.
+    """
+
+    def __init__(self, loader: Callable[[str, str, str], LoadedModel] = load_model) -> None:
+        self._loader = loader
+        self._sources: Dict[str, Tuple[str, str]] = {}
+        self._models: Dict[str, LoadedModel] = {}
+        self._signatures: Dict[str, Optional[Tuple[int, int, int]]] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, path: str, version: str = "") -> None:
+        """Serve ``path`` as ``name``; ``version`` is a label passed to the loader."""
+        with self._lock:
+            if self._sources.get(name) != (path, version):
+                self._sources[name] = (path, version)
+                self._models.pop(name, None)
+
+    def names(self) -> List[str]:
+        return list(self._sources)
+
+    def get(self, name: str) -> LoadedModel:
+        if name not in self._sources:
+            raise ValueError(f"unknown model {name!r}; registered: {self.names()}")
+        model = self._models.get(name)
+        if model is not None:
+            interval = get_settings().MODEL_RELOAD_INTERVAL_SECONDS
+            if interval <= 0 or time.monotonic() - self._checked_at[name] < interval:
+                return model
+            # someone else is checking: keep serving the current version
+            if not self._lock.acquire(blocking=False):
+                return model
+        else:
+            self._lock.acquire()
+        try:
+            return self._refresh(name)
+        finally:
+            self._lock.release()
+
+    def _refresh(self, name: str) -> LoadedModel:
+        path, version = self._sources[name]
+        current = self._models.get(name)
+        self._checked_at[name] = time.monotonic()
+        signature = _stat_signature(path)
+        if current is not None and signature == self._signatures.get(name):
+            return current
+        if current is not None and current.checksum and signature is None:
+            logger.warning("model %s: %s is missing, still serving %s", name, path, current.version)
+            return current
+        try:
+            if current is not None and current.checksum and signature and file_checksum(path) == current.checksum:
+                self._signatures[name] = signature  # touched or copied, same bytes
+                return current
+            model = self._loader(name, path, version)
+        except Exception:
+            if current is None:
+                raise
+            logger.exception("model %s: failed to load %s, still serving %s", name, path, current.version)
+            return current
+        self._signatures[name] = signature
+        self._models[name] = model
+        if current is not None:
+            logger.info("model %s: swapped %s -> %s", name, current.version, model.version)
+        return model
+
+
+PRIMARY = "primary"
+SHADOW = "shadow"
+
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ModelRegistry:
+    """The process-wide registry: ``primary`` from ``MODEL_PATH`` and, when
+    ``SHADOW_MODEL_PATH`` is set, the ``shadow`` candidate."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            settings = get_settings()
+            _registry = ModelRegistry()
+            _registry.register(PRIMARY, _model_path(), settings.MODEL_VERSION)
+            if settings.SHADOW_MODEL_PATH:
+                _registry.register(SHADOW, settings.SHADOW_MODEL_PATH)
+        return _registry
+
+
+def get_model(name: str = PRIMARY) -> LoadedModel:
+    return get_registry().get(name)
+
+
+def current_models() -> Tuple[LoadedModel, Optional[LoadedModel]]:
+    """The primary model and the shadow candidate, if one is configured."""
+    registry = get_registry()
+    return registry.get(PRIMARY), registry.get(SHADOW) if SHADOW in registry.names() else None
+
+
+def get_model_version() -> str:
+    """Checksum of the model file, prefixed with ``MODEL_VERSION`` if set, else ``"fallback"``."""
+    return get_model().version
+
+
+def get_feature_schema() -> FeatureSchema:
+    return get_model().schema
+
+
+def infer_batch(features: np.ndarray) -> np.ndarray:
+    """Score an ``(N, F)`` feature matrix with the current primary model."""
+    return get_model().infer_batch(features)
 
 
 def infer(features: np.ndarray) -> float:
-    sess = _get_session()
-    if sess is None:
-        # Deterministic lightweight fallback: logistic of feature mean
-        x = float(np.clip(features.mean(), 0.0, 10.0))
-        prob = 1.0 / (1.0 + np.exp(-x + 2.0))
-        return float(np.clip(prob, 0.0, 1.0))
-
-    input_name = sess.get_inputs()[0].name
-    output_name = sess.get_outputs()[0].name
-    out = sess.run([output_name], {input_name: features.astype(np.float32)})[0]
-    # assume output is probability shape (N, 1) or (N,)
-    prob = float(out.reshape(-1)[0])
-    return float(np.clip(prob, 0.0, 1.0))
+    return float(infer_batch(features)[0])
+
 
+def warmup(batch_size: int = 1) -> None:
+    """Load the models and run a dummy batch through each so the first real job skips it."""
+    for model in current_models():
+        if model is not None:
+            model.infer_batch(np.zeros((max(1, batch_size), len(model.schema)), dtype=model.schema.dtype))
 
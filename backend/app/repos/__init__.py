@@ -1,3 +1 @@
-from .db import Base, get_async_engine
-
-
+from .db import Base, dispose_engines, get_async_engine, get_sync_engine, to_sync_url
@@ -1,3 +1,9 @@
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 
@@ -8,8 +14,84 @@ class Base(DeclarativeBase):
     pass
 
 
-def get_async_engine() -> AsyncEngine:
+def to_sync_url(url: str) -> str:
+    # Convert common async URLs to the sync driver (worker, scripts, alembic)
+    return url.replace("+asyncpg", "+psycopg").replace("+aiosqlite", "+pysqlite")
+
+
+# One engine per URL per process. The pid is recorded so a forked child
+# (RQ work-horse, uvicorn/gunicorn worker) resets the inherited pool instead
+# of sharing the parent's sockets.
+_async_engines: Dict[str, Tuple[AsyncEngine, int]] = {}
+_sync_engines: Dict[str, Tuple[Engine, int]] = {}
+_lock = threading.Lock()
+
+
+def _pool_kwargs(url: str, pool_size: int, max_overflow: int, pre_ping: bool, recycle: int) -> Dict[str, Any]:
+    settings = get_settings()
+    kwargs: Dict[str, Any] = {"pool_pre_ping": pre_ping, "pool_recycle": recycle}
+    # sqlite picks its own pool class (NullPool/SingletonThreadPool) that takes no sizing options
+    if not url.startswith("sqlite"):
+        kwargs.update(pool_size=pool_size, max_overflow=max_overflow, pool_timeout=settings.DB_POOL_TIMEOUT)
+    return kwargs
+
+
+def get_async_engine(url: Optional[str] = None) -> AsyncEngine:
+    settings = get_settings()
+    url = url or settings.DB_URL
+    pid = os.getpid()
+    with _lock:
+        entry = _async_engines.get(url)
+        if entry is not None:
+            engine, owner_pid = entry
+            if owner_pid != pid:
+                engine.sync_engine.dispose(close=False)
+                _async_engines[url] = (engine, pid)
+            return engine
+        kwargs = _pool_kwargs(
+            url, settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW, settings.DB_POOL_PRE_PING, settings.DB_POOL_RECYCLE
+        )
+        if "+asyncpg" in url:
+            kwargs["connect_args"] = {
+                "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+                "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            }
+        engine = create_async_engine(url, echo=False, future=True, **kwargs)
+        _async_engines[url] = (engine, pid)
+        return engine
+
+
+def get_sync_engine(url: Optional[str] = None) -> Engine:
+    """Sync engine for ``url`` (async driver names are converted), pooled per process."""
     settings = get_settings()
-    return create_async_engine(settings.DB_URL, echo=False, future=True)
+    url = to_sync_url(url or settings.DB_URL)
+    pid = os.getpid()
+    with _lock:
+        entry = _sync_engines.get(url)
+        if entry is not None:
+            engine, owner_pid = entry
+            if owner_pid != pid:
+                engine.dispose(close=False)
+                _sync_engines[url] = (engine, pid)
+            return engine
+        kwargs = _pool_kwargs(
+            url,
+            settings.WORKER_DB_POOL_SIZE,
+            settings.WORKER_DB_MAX_OVERFLOW,
+            settings.WORKER_DB_POOL_PRE_PING,
+            settings.WORKER_DB_POOL_RECYCLE,
+        )
+        engine = create_engine(url, future=True, **kwargs)
+        _sync_engines[url] = (engine, pid)
+        return engine
 
 
+async def dispose_engines() -> None:
+    """Close every pooled connection; engines stay usable and reconnect lazily."""
+    with _lock:
+        async_engines = [engine for engine, _ in _async_engines.values()]
+        sync_engines = [engine for engine, _ in _sync_engines.values()]
+    for engine in async_engines:
+        await engine.dispose()
+    for sync_engine in sync_engines:
+        sync_engine.dispose()
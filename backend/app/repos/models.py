@@ -1,12 +1,17 @@
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import String, Text, ForeignKey
+from sqlalchemy import JSON, Index, String, Text, ForeignKey, UniqueConstraint
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .db import Base
 
 
+# {feature name: value}; JSONB on Postgres so features can be queried in SQL
+FeaturesJSON = JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), "postgresql")
+
+
 class User(Base):
     __tablename__ = "users"
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
@@ -26,12 +31,20 @@ class Document(Base):
 
 class Job(Base):
     __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_user_id_id", "user_id", "id"),
+        Index("ix_jobs_user_id_status_id", "user_id", "status", "id"),
+    )
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     job_uuid: Mapped[str] = mapped_column(String(64), unique=True, index=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     document_id: Mapped[int] = mapped_column(ForeignKey("documents.id"))
     status: Mapped[str] = mapped_column(String(32), index=True, default="PENDING")
     meta: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    # latest Result, written in the same transaction as the final status
+    result_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("results.id", use_alter=True, name="fk_jobs_result_id"), nullable=True
+    )
     created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
     user: Mapped[User] = relationship()
     document: Mapped[Document] = relationship()
@@ -39,13 +52,42 @@ class Job(Base):
 
 class Result(Base):
     __tablename__ = "results"
+    __table_args__ = (Index("ix_results_job_id_id", "job_id", "id"),)
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     job_id: Mapped[int] = mapped_column(ForeignKey("jobs.id"))
     probability: Mapped[Optional[float]] = mapped_column(nullable=True)
     summary: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
-    feature_summary: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    language: Mapped[Optional[str]] = mapped_column(String(16), nullable=True)
+    features: Mapped[Optional[dict]] = mapped_column(FeaturesJSON, nullable=True)
+    # version of the feature schema ``features`` was computed under
+    feature_schema: Mapped[Optional[str]] = mapped_column(String(16), nullable=True)
+    # [{"start": int, "end": int, "probability": float}] in segmented mode
+    segments: Mapped[Optional[list]] = mapped_column(JSON, nullable=True)
+    # model that produced ``probability``, and the shadow candidate's score if one ran
+    model_version: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    shadow_probability: Mapped[Optional[float]] = mapped_column(nullable=True)
+    shadow_model_version: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
     latency_ms: Mapped[Optional[int]] = mapped_column(nullable=True)
     created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
-    job: Mapped[Job] = relationship()
+    job: Mapped[Job] = relationship(foreign_keys=[job_id])
+
+
 
 
+class ResultCacheEntry(Base):
+    __tablename__ = "result_cache"
+    __table_args__ = (UniqueConstraint("content_hash", "model_version", name="uq_result_cache_hash_version"),)
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    content_hash: Mapped[str] = mapped_column(String(64))
+    # primary model version, "+shadow version" while a shadow model runs
+    model_version: Mapped[str] = mapped_column(String(160))
+    probability: Mapped[Optional[float]] = mapped_column(nullable=True)
+    summary: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    language: Mapped[Optional[str]] = mapped_column(String(16), nullable=True)
+    features: Mapped[Optional[dict]] = mapped_column(FeaturesJSON, nullable=True)
+    # version of the feature schema ``features`` was computed under
+    feature_schema: Mapped[Optional[str]] = mapped_column(String(16), nullable=True)
+    segments: Mapped[Optional[list]] = mapped_column(JSON, nullable=True)
+    shadow_probability: Mapped[Optional[float]] = mapped_column(nullable=True)
+    shadow_model_version: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow, index=True)
@@ -1,9 +1,13 @@
+import asyncio
+import re
 import time
-from typing import Any, Dict, Optional
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
 
 import httpx
 from fastapi import Depends, HTTPException, Request
-from jose import jwt
+from jose import jwk, jwt
+from jose.backends.base import Key
 
 from ..config import get_settings
 
@@ -11,56 +15,121 @@ from ..config import get_settings
 _GOOGLE_CERTS_URL = (
     "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
 )
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+_DEFAULT_MAX_AGE = 3600
 
 
 class JWKsCache:
+    """Google signing keys by ``kid``, parsed once per fetch.
+
+    Keys are kept for the response's ``Cache-Control: max-age``. Concurrent
+    callers that find the keys stale share a single refresh.
+    """
+
     def __init__(self) -> None:
-        self._certs: Dict[str, str] = {}
+        self._keys: Dict[str, Key] = {}
         self._expires_at: float = 0
+        self._fetched_at: float = 0
+        self._lock = asyncio.Lock()
 
-    async def get_certs(self) -> Dict[str, str]:
-        now = time.time()
-        if self._certs and now < self._expires_at:
-            return self._certs
+    async def _fetch(self) -> Tuple[Dict[str, str], int]:
         async with httpx.AsyncClient(timeout=10) as client:
             resp = await client.get(_GOOGLE_CERTS_URL)
             resp.raise_for_status()
-            # Cache for 1 hour
-            self._certs = resp.json()
-            self._expires_at = now + 3600
-            return self._certs
+            match = _MAX_AGE_RE.search(resp.headers.get("Cache-Control", ""))
+            return resp.json(), int(match.group(1)) if match else _DEFAULT_MAX_AGE
+
+    async def _refresh(self, stale_before: float) -> None:
+        async with self._lock:
+            # another caller may have refreshed while this one waited
+            if self._fetched_at > stale_before and self._keys:
+                return
+            certs, max_age = await self._fetch()
+            now = time.time()
+            self._keys = {kid: jwk.construct(pem, "RS256") for kid, pem in certs.items()}
+            self._fetched_at = now
+            self._expires_at = now + max_age
+
+    async def get_key(self, kid: str) -> Optional[Key]:
+        now = time.time()
+        if not self._keys or now >= self._expires_at:
+            await self._refresh(now)
+        key = self._keys.get(kid)
+        if key is None and now - self._fetched_at >= get_settings().AUTH_KEYS_MIN_REFRESH_SECONDS:
+            # unknown kid: Google may have rotated keys before max-age ran out
+            await self._refresh(now)
+            key = self._keys.get(kid)
+        return key
+
+
+class VerifiedTokenCache:
+    """Bounded LRU of verified claims; an entry lives until the token's ``exp``."""
+
+    def __init__(self, maxsize: int) -> None:
+        self._maxsize = maxsize
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        if time.time() >= entry[0]:
+            del self._entries[token]
+            return None
+        self._entries.move_to_end(token)
+        return entry[1]
+
+    def put(self, token: str, exp: float, info: Dict[str, Any]) -> None:
+        if self._maxsize <= 0:
+            return
+        self._entries[token] = (exp, info)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
 
 
 _jwks_cache = JWKsCache()
+_token_cache = VerifiedTokenCache(get_settings().AUTH_TOKEN_CACHE_SIZE)
 
 
 async def verify_firebase_token(id_token: str) -> Dict[str, Any]:
+    cached = _token_cache.get(id_token)
+    if cached is not None:
+        return cached
+
     settings = get_settings()
-    certs = await _jwks_cache.get_certs()
-
-    last_err: Optional[Exception] = None
-    for kid, cert_pem in certs.items():
-        try:
-            payload = jwt.decode(
-                id_token,
-                cert_pem,
-                algorithms=["RS256"],
-                audience=settings.FIREBASE_PROJECT_ID,
-                issuer=settings.FIREBASE_ISSUER or f"https://securetoken.google.com/{settings.FIREBASE_PROJECT_ID}",
-                options={"verify_exp": True},
-            )
-            # Validate required claims
-            if not payload.get("sub"):
-                raise HTTPException(status_code=401, detail="Invalid token: missing sub")
-            return {
-                "uid": payload.get("user_id") or payload.get("sub"),
-                "email": payload.get("email"),
-                "claims": payload,
-            }
-        except Exception as e:  # try next cert
-            last_err = e
-            continue
-    raise HTTPException(status_code=401, detail=f"Invalid token: {last_err}")
+    try:
+        kid = jwt.get_unverified_header(id_token).get("kid")
+    except Exception as e:
+        raise HTTPException(status_code=401, detail=f"Invalid token: {e}")
+    key = await _jwks_cache.get_key(kid) if kid else None
+    if key is None:
+        raise HTTPException(status_code=401, detail="Invalid token: unknown signing key")
+    try:
+        payload = jwt.decode(
+            id_token,
+            key,
+            algorithms=["RS256"],
+            audience=settings.FIREBASE_PROJECT_ID,
+            issuer=settings.FIREBASE_ISSUER or f"https://securetoken.google.com/{settings.FIREBASE_PROJECT_ID}",
+            options={"verify_exp": True},
+        )
+    except Exception as e:
+        raise HTTPException(status_code=401, detail=f"Invalid token: {e}")
+    # Validate required claims
+    if not payload.get("sub"):
+        raise HTTPException(status_code=401, detail="Invalid token: missing sub")
+    info = {
+        "uid": payload.get("user_id") or payload.get("sub"),
+        "email": payload.get("email"),
+        "claims": payload,
+    }
+    if payload.get("exp"):
+        _token_cache.put(id_token, float(payload["exp"]), info)
+    return info
 
 
 async def auth_dependency(request: Request) -> Dict[str, Any]:
@@ -72,5 +141,3 @@ async def auth_dependency(request: Request) -> Dict[str, Any]:
     # attach to request state for downstream access
     request.state.auth = info
     return info
-
-
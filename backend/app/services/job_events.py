@@ -0,0 +1,156 @@
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, Iterable, Mapping, Optional, Set, Tuple
+
+import redis
+import redis.asyncio as aioredis
+
+from ..config import get_settings
+
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("SUCCEEDED", "FAILED")
+# Result fields included in events; same keys as GET /api/jobs/{id}
+RESULT_FIELDS = (
+    "probability",
+    "summary",
+    "language",
+    "features",
+    "feature_schema",
+    "segments",
+    "model_version",
+    "latency_ms",
+)
+
+
+def channel(user_id: int) -> str:
+    return f"job_events:{user_id}"
+
+
+def job_event(job_uuid: str, status: str, result: Optional[Mapping[str, Any]] = None) -> Dict[str, Any]:
+    event: Dict[str, Any] = {"id": job_uuid, "status": status}
+    if result:
+        event.update({field: result.get(field) for field in RESULT_FIELDS})
+    return event
+
+
+@lru_cache(maxsize=1)
+def _get_redis() -> redis.Redis:
+    return redis.from_url(get_settings().REDIS_URL)
+
+
+def publish_many(events: Iterable[Tuple[int, Dict[str, Any]]]) -> None:
+    """Publish ``(user_id, event)`` pairs in one round trip.
+
+    Delivery is best effort: clients re-read the current state when they
+    (re)connect, so a failed publish is logged and never fails the job.
+    """
+    events = list(events)
+    if not events:
+        return
+    try:
+        pipe = _get_redis().pipeline(transaction=False)
+        for user_id, event in events:
+            pipe.publish(channel(user_id), json.dumps(event))
+        pipe.execute()
+    except Exception:
+        logger.warning("job event publish failed", exc_info=True)
+
+
+def publish(user_id: int, event: Dict[str, Any]) -> None:
+    publish_many([(user_id, event)])
+
+
+class JobEventHub:
+    """Fans job events from one Redis pub/sub connection out to local clients.
+
+    An API process owns one hub (see ``app.main``). A user's channel stays
+    subscribed while at least one local client listens to it; each client
+    gets a bounded queue and a slow client loses its oldest updates.
+    """
+
+    def __init__(self, client: Optional[aioredis.Redis] = None, queue_size: int = 100) -> None:
+        self._client = client
+        self._owns_client = client is None
+        self._queue_size = queue_size
+        self._pubsub: Optional[aioredis.client.PubSub] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._lock = asyncio.Lock()
+
+    @asynccontextmanager
+    async def subscribe(self, user_id: int) -> AsyncIterator[asyncio.Queue]:
+        name = channel(user_id)
+        updates: asyncio.Queue = asyncio.Queue(self._queue_size)
+        async with self._lock:
+            if self._pubsub is None:
+                if self._client is None:
+                    self._client = aioredis.from_url(get_settings().REDIS_URL)
+                self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            subscribers = self._subscribers.setdefault(name, set())
+            if not subscribers:
+                await self._pubsub.subscribe(name)
+            subscribers.add(updates)
+            if self._listener is None or self._listener.done():
+                self._listener = asyncio.create_task(self._listen())
+        try:
+            yield updates
+        finally:
+            async with self._lock:
+                subscribers = self._subscribers.get(name)
+                if subscribers is not None:
+                    subscribers.discard(updates)
+                    if not subscribers:
+                        del self._subscribers[name]
+                        try:
+                            await self._pubsub.unsubscribe(name)
+                        except Exception:
+                            logger.warning("job event unsubscribe failed", exc_info=True)
+
+    def _dispatch(self, name: str, event: Dict[str, Any]) -> None:
+        for updates in list(self._subscribers.get(name, ())):
+            if updates.full():
+                updates.get_nowait()
+            updates.put_nowait(event)
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # redis-py reconnects and resubscribes on the next read
+                logger.warning("job event subscriber error; retrying", exc_info=True)
+                await asyncio.sleep(1.0)
+                continue
+            if not message or message.get("type") != "message":
+                continue
+            name = message["channel"]
+            if isinstance(name, bytes):
+                name = name.decode()
+            try:
+                event = json.loads(message["data"])
+            except ValueError:
+                continue
+            self._dispatch(name, event)
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        if self._owns_client and self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._subscribers.clear()
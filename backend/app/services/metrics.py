@@ -0,0 +1,71 @@
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest
+from prometheus_client import multiprocess, start_http_server
+
+
+# prometheus_client switches to file-backed values when PROMETHEUS_MULTIPROC_DIR
+# is set before it is imported; RQ work-horses are forked per job, so workers
+# must run with it or their samples die with the child.
+_STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+STAGE_SECONDS = Histogram(
+    "worker_stage_seconds",
+    "Time spent per processing stage (read, langdetect, features, inference, shadow_inference, db_write)",
+    ["stage"],
+    buckets=_STAGE_BUCKETS,
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "job_queue_wait_seconds",
+    "Time from job creation to the worker starting it",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600),
+)
+JOBS_TOTAL = Counter("jobs_processed_total", "Jobs finished by the worker", ["outcome"])
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "API request latency until the response starts",
+    ["method", "route", "status"],
+)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(name).observe(time.perf_counter() - start)
+
+
+def observe_queue_wait(created_at: Optional[datetime]) -> None:
+    # created_at is naive UTC (datetime.utcnow default)
+    if created_at is not None:
+        QUEUE_WAIT_SECONDS.observe(max(0.0, (datetime.utcnow() - created_at).total_seconds()))
+
+
+def job_finished(outcome: str, count: int = 1) -> None:
+    if count:
+        JOBS_TOTAL.labels(outcome).inc(count)
+
+
+def _registry() -> CollectorRegistry:
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render() -> bytes:
+    """Exposition text for every process sharing this one's metrics."""
+    return generate_latest(_registry())
+
+
+def start_worker_server(port: int) -> None:
+    """Serve /metrics from an RQ worker (aggregated over forked work-horses)."""
+    start_http_server(port, registry=_registry())
+
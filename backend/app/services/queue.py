@@ -1,23 +1,60 @@
+import threading
+from datetime import timedelta
+from typing import Dict, List, Optional, Sequence
+
+from anyio.to_thread import run_sync
 from rq import Queue
-from rq.retry import Retry
+from rq import Retry
 import redis
 
 from ..config import get_settings
 
 
+PENDING_BATCH_KEY = "jobs:pending"
+_BATCH_WINDOW_KEY = "jobs:pending:window"
+
+# Task references by import path: RQ resolves them in the worker, so the API
+# never imports the worker's model dependencies.
+_PROCESS_JOB = "app.workers.rq_tasks.process_job"
+_PROCESS_JOBS_BATCH = "app.workers.rq_tasks.process_jobs_batch"
+_DRAIN_PENDING_JOBS = "app.workers.rq_tasks.drain_pending_jobs"
+
+_conn: Optional[redis.Redis] = None
+_queues: Dict[str, Queue] = {}
+_lock = threading.Lock()
+
+
 def _get_connection() -> redis.Redis:
-    settings = get_settings()
-    return redis.from_url(settings.REDIS_URL)
+    """Process-wide client backed by one pool of ``REDIS_MAX_CONNECTIONS``."""
+    global _conn
+    with _lock:
+        if _conn is None:
+            settings = get_settings()
+            _conn = redis.from_url(settings.REDIS_URL, max_connections=settings.REDIS_MAX_CONNECTIONS)
+        return _conn
 
 
-def enqueue_job(job_uuid: str) -> str:
+def _get_queue(name: str = "jobs") -> Queue:
     conn = _get_connection()
-    q = Queue("jobs", connection=conn, default_timeout=600)
-    # Lazy import to avoid heavy deps on API import
-    from ..workers.rq_tasks import process_job  # type: ignore
+    with _lock:
+        q = _queues.get(name)
+        if q is None:
+            q = _queues[name] = Queue(name, connection=conn, default_timeout=600)
+        return q
+
+
+def reset_connection() -> None:
+    """Drop the cached client and queues (e.g. after settings change)."""
+    global _conn
+    with _lock:
+        _conn = None
+        _queues.clear()
+
 
+def enqueue_job(job_uuid: str) -> str:
+    q = _get_queue()
     job = q.enqueue(
-        process_job,
+        _PROCESS_JOB,
         job_uuid,
         retry=Retry(max=3, interval=[5, 10, 20]),
         failure_ttl=86400,
@@ -26,3 +63,108 @@ def enqueue_job(job_uuid: str) -> str:
     return job.id
 
 
+def enqueue_many(job_uuids: Sequence[str]) -> List[str]:
+    """Enqueue one ``process_job`` per id, writing all of them in one Redis pipeline."""
+    if not job_uuids:
+        return []
+    q = _get_queue()
+    jobs = q.enqueue_many(
+        [
+            Queue.prepare_data(
+                _PROCESS_JOB,
+                (job_uuid,),
+                retry=Retry(max=3, interval=[5, 10, 20]),
+                failure_ttl=86400,
+                timeout=600,
+            )
+            for job_uuid in job_uuids
+        ]
+    )
+    return [job.id for job in jobs]
+
+
+def enqueue_batches(job_uuids: Sequence[str]) -> List[str]:
+    """Enqueue ``process_jobs_batch`` tasks of up to ``JOB_BATCH_SIZE`` ids in one pipeline."""
+    if not job_uuids:
+        return []
+    size = max(1, get_settings().JOB_BATCH_SIZE)
+    q = _get_queue()
+    jobs = q.enqueue_many(
+        [
+            Queue.prepare_data(
+                _PROCESS_JOBS_BATCH,
+                (list(job_uuids[i : i + size]),),
+                retry=Retry(max=3, interval=[5, 10, 20]),
+                failure_ttl=86400,
+                timeout=600,
+            )
+            for i in range(0, len(job_uuids), size)
+        ]
+    )
+    return [job.id for job in jobs]
+
+
+def enqueue_job_batched(job_uuid: str) -> Optional[str]:
+    """Buffer ``job_uuid`` and enqueue a batch task once the buffer is full.
+
+    Job ids collect in a Redis list shared by all API processes. The first id
+    of a window schedules a delayed ``drain_pending_jobs`` task so stragglers wait
+    at most ``JOB_BATCH_WINDOW_MS``; reaching ``JOB_BATCH_SIZE`` flushes
+    immediately. Returns the RQ id of the batch job if one was enqueued.
+    """
+    settings = get_settings()
+    conn = _get_connection()
+    pipe = conn.pipeline()
+    pipe.rpush(PENDING_BATCH_KEY, job_uuid)
+    pipe.set(_BATCH_WINDOW_KEY, 1, nx=True, px=max(1, settings.JOB_BATCH_WINDOW_MS))
+    pending, window_opened = pipe.execute()
+
+    if window_opened:
+        _get_queue().enqueue_in(timedelta(milliseconds=settings.JOB_BATCH_WINDOW_MS), _DRAIN_PENDING_JOBS)
+    if pending >= settings.JOB_BATCH_SIZE:
+        return flush_pending_jobs()
+    return None
+
+
+def flush_pending_jobs() -> Optional[str]:
+    """Pop up to ``JOB_BATCH_SIZE`` buffered job ids and enqueue them as one batch."""
+    settings = get_settings()
+    conn = _get_connection()
+    pipe = conn.pipeline()  # MULTI/EXEC: concurrent flushers never pop the same ids
+    pipe.lrange(PENDING_BATCH_KEY, 0, settings.JOB_BATCH_SIZE - 1)
+    pipe.ltrim(PENDING_BATCH_KEY, settings.JOB_BATCH_SIZE, -1)
+    raw, _ = pipe.execute()
+    job_uuids: List[str] = [u.decode() if isinstance(u, bytes) else u for u in raw]
+    if not job_uuids:
+        return None
+    conn.delete(_BATCH_WINDOW_KEY)
+
+    job = _get_queue().enqueue(
+        _PROCESS_JOBS_BATCH,
+        job_uuids,
+        retry=Retry(max=3, interval=[5, 10, 20]),
+        failure_ttl=86400,
+        job_timeout=600,
+    )
+    return job.id
+
+
+async def enqueue_job_async(job_uuid: str) -> str:
+    """``enqueue_job`` for request handlers, run off the event loop.
+
+    RQ only speaks the sync redis client, so the pooled enqueue runs on a
+    worker thread instead of blocking the loop.
+    """
+    return await run_sync(enqueue_job, job_uuid)
+
+
+async def enqueue_job_batched_async(job_uuid: str) -> Optional[str]:
+    return await run_sync(enqueue_job_batched, job_uuid)
+
+
+async def enqueue_many_async(job_uuids: Sequence[str]) -> List[str]:
+    return await run_sync(enqueue_many, job_uuids)
+
+
+async def enqueue_batches_async(job_uuids: Sequence[str]) -> List[str]:
+    return await run_sync(enqueue_batches, job_uuids)
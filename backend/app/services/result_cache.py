@@ -0,0 +1,188 @@
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import redis
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from ..config import get_settings
+from ..repos.models import ResultCacheEntry
+
+
+logger = logging.getLogger(__name__)
+
+HITS_KEY = "result_cache:hits"
+MISSES_KEY = "result_cache:misses"
+
+# Fields copied from a cached entry onto a new Result
+_PAYLOAD_FIELDS = (
+    "probability",
+    "summary",
+    "language",
+    "features",
+    "feature_schema",
+    "segments",
+    "shadow_probability",
+    "shadow_model_version",
+)
+# Bumped when the payload shape changes so stale Redis entries are never read
+_PAYLOAD_VERSION = 4
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _key(digest: str, model_version: str) -> str:
+    return f"result_cache:v{_PAYLOAD_VERSION}:{model_version}:{digest}"
+
+
+@lru_cache(maxsize=1)
+def _get_redis() -> redis.Redis:
+    settings = get_settings()
+    return redis.from_url(settings.REDIS_URL)
+
+
+def lookup_many(session: Session, digests: Iterable[str], model_version: str) -> Dict[str, Dict[str, Any]]:
+    """Return cached payloads for ``digests``, keyed by digest.
+
+    Redis is checked first; misses fall through to the ``result_cache`` table
+    and DB hits are written back to Redis. Redis being unavailable degrades to
+    DB-only lookups. Hit and miss counters are kept in Redis.
+    """
+    settings = get_settings()
+    wanted = list(dict.fromkeys(digests))
+    if not settings.RESULT_CACHE_ENABLED or not wanted:
+        return {}
+
+    found: Dict[str, Dict[str, Any]] = {}
+    conn: Optional[redis.Redis] = _get_redis()
+    try:
+        for digest, raw in zip(wanted, conn.mget([_key(d, model_version) for d in wanted])):  # type: ignore[union-attr]
+            if raw is not None:
+                found[digest] = json.loads(raw)
+    except redis.RedisError as e:
+        logger.warning("result cache: redis unavailable, using DB tier only: %s", e)
+        conn = None
+
+    missing = [d for d in wanted if d not in found]
+    if missing:
+        cutoff = datetime.utcnow() - timedelta(days=settings.RESULT_CACHE_DB_TTL_DAYS)
+        rows = session.scalars(
+            select(ResultCacheEntry).where(
+                ResultCacheEntry.model_version == model_version,
+                ResultCacheEntry.content_hash.in_(missing),
+                ResultCacheEntry.created_at >= cutoff,
+            )
+        ).all()
+        backfill = {}
+        for row in rows:
+            payload = {f: getattr(row, f) for f in _PAYLOAD_FIELDS}
+            found[row.content_hash] = payload
+            backfill[row.content_hash] = payload
+        if conn is not None and backfill:
+            _write_redis(conn, backfill, model_version)
+
+    if conn is not None:
+        try:
+            pipe = conn.pipeline(transaction=False)
+            pipe.incrby(HITS_KEY, len(found))
+            pipe.incrby(MISSES_KEY, len(wanted) - len(found))
+            pipe.execute()
+        except redis.RedisError:
+            pass
+    return found
+
+
+def lookup(session: Session, digest: str, model_version: str) -> Optional[Dict[str, Any]]:
+    return lookup_many(session, [digest], model_version).get(digest)
+
+
+def lookup_features(session: Session, digests: Iterable[str]) -> Dict[str, Tuple[str, Dict[str, float]]]:
+    """Latest stored ``(feature_schema, features)`` per digest, under any model version.
+
+    Lets a new model reuse the features it shares with an earlier one instead
+    of recomputing them. DB tier only; rows without a schema are skipped.
+    """
+    settings = get_settings()
+    wanted = list(dict.fromkeys(digests))
+    if not settings.RESULT_CACHE_ENABLED or not wanted:
+        return {}
+    cutoff = datetime.utcnow() - timedelta(days=settings.RESULT_CACHE_DB_TTL_DAYS)
+    rows = session.execute(
+        select(ResultCacheEntry.content_hash, ResultCacheEntry.feature_schema, ResultCacheEntry.features)
+        .where(
+            ResultCacheEntry.content_hash.in_(wanted),
+            ResultCacheEntry.feature_schema.is_not(None),
+            ResultCacheEntry.features.is_not(None),
+            ResultCacheEntry.created_at >= cutoff,
+        )
+        .order_by(ResultCacheEntry.id.desc())
+    ).all()
+    found: Dict[str, Tuple[str, Dict[str, float]]] = {}
+    for digest, schema_version, features in rows:
+        found.setdefault(digest, (schema_version, features))
+    return found
+
+
+def _write_redis(conn: redis.Redis, payloads: Dict[str, Dict[str, Any]], model_version: str) -> None:
+    ttl = get_settings().RESULT_CACHE_TTL_SECONDS
+    try:
+        pipe = conn.pipeline(transaction=False)
+        for digest, payload in payloads.items():
+            pipe.set(_key(digest, model_version), json.dumps(payload), ex=ttl)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("result cache: failed to write redis tier: %s", e)
+
+
+def store_many(session: Session, payloads: Dict[str, Dict[str, Any]], model_version: str) -> None:
+    """Persist freshly computed payloads to both tiers.
+
+    Runs in its own transaction after the job's results are committed, so a
+    concurrent worker inserting the same key never fails the job.
+    """
+    if not get_settings().RESULT_CACHE_ENABLED or not payloads:
+        return
+    try:
+        existing = set(
+            session.scalars(
+                select(ResultCacheEntry.content_hash).where(
+                    ResultCacheEntry.model_version == model_version,
+                    ResultCacheEntry.content_hash.in_(list(payloads)),
+                )
+            ).all()
+        )
+        session.add_all(
+            ResultCacheEntry(content_hash=digest, model_version=model_version, **payload)
+            for digest, payload in payloads.items()
+            if digest not in existing
+        )
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        logger.warning("result cache: failed to write DB tier: %s", e)
+    _write_redis(_get_redis(), payloads, model_version)
+
+
+def store(session: Session, digest: str, model_version: str, payload: Dict[str, Any]) -> None:
+    store_many(session, {digest: payload}, model_version)
+
+
+def purge_expired(session: Session) -> int:
+    """Delete DB entries older than ``RESULT_CACHE_DB_TTL_DAYS``; returns rows removed."""
+    cutoff = datetime.utcnow() - timedelta(days=get_settings().RESULT_CACHE_DB_TTL_DAYS)
+    res = session.execute(delete(ResultCacheEntry).where(ResultCacheEntry.created_at < cutoff))
+    session.commit()
+    return res.rowcount or 0
+
+
+def get_stats() -> Dict[str, int]:
+    conn = _get_redis()
+    hits, misses = conn.mget([HITS_KEY, MISSES_KEY])
+    return {"hits": int(hits or 0), "misses": int(misses or 0)}
+
@@ -1,12 +1,29 @@
+import codecs
 import time
 import uuid
-from typing import Tuple
+from functools import lru_cache
+from typing import BinaryIO, Iterator, Optional, Tuple
 
 import boto3
+from botocore.config import Config
 
 from ..config import get_settings
 
 
+class DocumentTooLarge(ValueError):
+    pass
+
+
+@lru_cache(maxsize=1)
+def get_s3_client():
+    settings = get_settings()
+    config = Config(
+        max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+        retries={"max_attempts": 3, "mode": "standard"},
+    )
+    return boto3.client("s3", region_name=settings.AWS_REGION, config=config)
+
+
 def get_presigned_put_url(key: str, content_type: str, expires_in: int = 900) -> Tuple[str, int]:
     settings = get_settings()
     if settings.ENABLE_STORAGE_STUB or not settings.S3_BUCKET:
@@ -14,7 +31,7 @@ def get_presigned_put_url(key: str, content_type: str, expires_in: int = 900) ->
         url = f"https://example.com/upload/{uuid.uuid4()}"
         return url, expires_in
 
-    s3 = boto3.client("s3", region_name=settings.AWS_REGION)
+    s3 = get_s3_client()
     url = s3.generate_presigned_url(
         ClientMethod="put_object",
         Params={"Bucket": settings.S3_BUCKET, "Key": key, "ContentType": content_type},
@@ -23,12 +40,56 @@ def get_presigned_put_url(key: str, content_type: str, expires_in: int = 900) ->
     return url, expires_in
 
 
-def read_text(key: str) -> str:
+def upload_fileobj(key: str, fileobj: BinaryIO, content_type: str) -> None:
+    """Stream a file-like object to the bucket (multipart for large bodies)."""
+    settings = get_settings()
+    if settings.ENABLE_STORAGE_STUB or not settings.S3_BUCKET:
+        return
+    get_s3_client().upload_fileobj(fileobj, settings.S3_BUCKET, key, ExtraArgs={"ContentType": content_type})
+
+
+def iter_text(key: str, max_bytes: Optional[int] = None, sample_bytes: Optional[int] = None) -> Iterator[str]:
+    """Stream an object as decoded UTF-8 text chunks.
+
+    Objects larger than ``max_bytes`` (default ``STORAGE_MAX_BYTES``; 0 disables
+    the cap) raise ``DocumentTooLarge``. With ``sample_bytes`` only that many
+    leading bytes are fetched via an HTTP Range request, and a multi-byte
+    character cut at the end of the sample is dropped.
+    """
     settings = get_settings()
     if settings.ENABLE_STORAGE_STUB or not settings.S3_BUCKET:
-        return "stubbed content"
-    s3 = boto3.client("s3", region_name=settings.AWS_REGION)
-    obj = s3.get_object(Bucket=settings.S3_BUCKET, Key=key)
-    return obj["Body"].read().decode("utf-8")
+        yield "stubbed content"
+        return
+    limit = settings.STORAGE_MAX_BYTES if max_bytes is None else max_bytes
+    params = {"Bucket": settings.S3_BUCKET, "Key": key}
+    if sample_bytes:
+        params["Range"] = f"bytes=0-{sample_bytes - 1}"
+    obj = get_s3_client().get_object(**params)
+    if limit and not sample_bytes and (obj.get("ContentLength") or 0) > limit:
+        raise DocumentTooLarge(f"{key} is {obj['ContentLength']} bytes, limit is {limit}")
+
+    body = obj["Body"]
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    seen = 0
+    try:
+        while True:
+            raw = body.read(settings.STORAGE_CHUNK_BYTES)
+            if not raw:
+                break
+            seen += len(raw)
+            if limit and seen > limit:
+                raise DocumentTooLarge(f"{key} exceeds {limit} bytes")
+            chunk = decoder.decode(raw)
+            if chunk:
+                yield chunk
+        tail = decoder.decode(b"", final=not sample_bytes)
+        if tail:
+            yield tail
+    finally:
+        body.close()
+
+
+def read_text(key: str, max_bytes: Optional[int] = None) -> str:
+    return "".join(iter_text(key, max_bytes=max_bytes))
 
 
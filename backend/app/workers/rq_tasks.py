@@ -1,69 +1,437 @@
+import hashlib
+import logging
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from typing import Generator
+from itertools import chain
+from typing import Callable, Dict, Generator, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
 
-from langdetect import detect
-from sqlalchemy import select
+import numpy as np
+from sqlalchemy import insert, select, update
 from sqlalchemy.orm import Session
-from sqlalchemy import create_engine
 
 from ..config import get_settings
-from ..services.storage import read_text
+from ..services import job_events, metrics, result_cache
+from ..services.storage import iter_text
+from ..repos.db import get_sync_engine
 from ..repos.models import Job, Result, Document
-from ..models.features import extract_features
-from ..models.onnx_runner import infer
+from ..models.feature_schema import FeatureSchema
+from ..models.features import FeatureAccumulator, extract_features, extract_window_features
+from ..models.langid import TextSampler, detect_languages, detect_samples
+from ..models.onnx_runner import LoadedModel, current_models
 
 
-def _to_sync_db_url(async_url: str) -> str:
-    # Convert common async URLs to sync driver for worker side
-    return async_url.replace("+asyncpg", "+psycopg").replace("+aiosqlite", "+pysqlite")
+logger = logging.getLogger(__name__)
 
 
 @contextmanager
 def get_sync_session() -> Generator[Session, None, None]:
-    settings = get_settings()
-    sync_url = _to_sync_db_url(settings.DB_URL)
-    engine = create_engine(sync_url, future=True)
-    with Session(engine) as session:
+    with Session(get_sync_engine(get_settings().DB_URL), expire_on_commit=False) as session:
         yield session
 
 
+Models = Tuple[LoadedModel, Optional[LoadedModel]]
+
+
+def scoring_mode() -> str:
+    """``"document"``, or the window settings in segmented mode, which change
+    both the probability and the segments of a result."""
+    settings = get_settings()
+    if not settings.SEGMENTED_SCORING_ENABLED:
+        return "document"
+    window = settings.SEGMENT_WINDOW_TOKENS
+    return f"seg{window}/{settings.SEGMENT_STRIDE_TOKENS or window}/{settings.SEGMENT_AGGREGATE}"
+
+
+def cache_version(models: Models) -> str:
+    """Result-cache key for a model pair under the current scoring mode: cached
+    payloads carry the shadow score and any window scores too."""
+    primary, shadow = models
+    version = primary.version if shadow is None else f"{primary.version}+{shadow.version}"
+    mode = scoring_mode()
+    return version if mode == "document" else f"{version}|{mode}"
+
+
+def _feature_rows(
+    cleaned: str, schema: FeatureSchema, known: Optional[Dict[str, float]] = None
+) -> Tuple[np.ndarray, dict, Optional[List[Tuple[int, int]]]]:
+    """Model input rows for one text: the document row, or one row per window
+    in segmented mode when the text spans more than one window."""
+    settings = get_settings()
+    feats, feat_summary = extract_features(cleaned, schema, known)
+    if settings.SEGMENTED_SCORING_ENABLED:
+        win_feats, spans = extract_window_features(
+            cleaned, settings.SEGMENT_WINDOW_TOKENS, settings.SEGMENT_STRIDE_TOKENS or None, schema
+        )
+        if len(spans) > 1:
+            return win_feats, feat_summary, spans
+    return feats, feat_summary, None
+
+
+def _aggregate(part: np.ndarray) -> float:
+    return float(part.max() if get_settings().SEGMENT_AGGREGATE == "max" else part.mean())
+
+
+def _shadow_scores(shadow: LoadedModel, rows: List[np.ndarray]) -> List[float]:
+    """One shadow probability per text, windows aggregated like the primary's."""
+    probs = shadow.infer_batch(np.vstack(rows))
+    ends = np.cumsum([len(r) for r in rows])
+    return [_aggregate(probs[end - len(r) : end]) for r, end in zip(rows, ends)]
+
+
+def score_texts(
+    texts: Sequence[str],
+    stored: Optional[Sequence[Optional[Tuple[str, Dict[str, float]]]]] = None,
+    models: Optional[Models] = None,
+) -> List[dict]:
+    """Score cleaned texts with one ``infer_batch`` call; returns Result payloads.
+
+    Each payload holds ``probability``, ``summary``, ``language``,
+    ``features`` (name -> value), ``feature_schema``, ``segments`` (None
+    unless segmented), ``shadow_probability`` and ``shadow_model_version``:
+    the Result columns a scoring run fills. Also used by ``scripts.score``.
+
+    Only the features of the model's schema are computed. ``stored`` holds,
+    per text, features previously saved under some schema (see
+    ``result_cache.lookup_features``); those the model's schema shares are
+    reused. In segmented mode a text longer than one window contributes one
+    row per window and its probability is the aggregate of the window scores.
+
+    ``models`` pins the primary and shadow model for the whole batch. The
+    shadow model scores the same texts in a second call, on the same rows when
+    it shares the primary's schema; its failures are logged, never raised.
+    """
+    models = models or current_models()
+    schema = models[0].schema
+    prepared: List[Tuple[np.ndarray, dict, Optional[List[Tuple[int, int]]]]] = []
+    with metrics.stage("langdetect"):
+        languages = detect_languages(texts)
+    for i, cleaned in enumerate(texts):
+        with metrics.stage("features"):
+            known = schema.reusable(*stored[i]) if stored and stored[i] else None
+            prepared.append(_feature_rows(cleaned, schema, known))
+    return _score_rows(prepared, languages, models, lambda s: [_feature_rows(cleaned, s)[0] for cleaned in texts])
+
+
+def _score_rows(
+    prepared: List[Tuple[np.ndarray, dict, Optional[List[Tuple[int, int]]]]],
+    languages: Sequence[str],
+    models: Models,
+    shadow_rows: Callable[[FeatureSchema], List[np.ndarray]],
+) -> List[dict]:
+    """Payloads for texts whose primary rows are ``prepared``; ``shadow_rows``
+    builds their rows under the shadow model's schema when it differs."""
+    primary, shadow = models
+    schema = primary.schema
+    payloads = [
+        {
+            "summary": f"lang={language}",
+            "language": language,
+            "features": feat_summary,
+            "feature_schema": schema.version,
+            "segments": None,
+            "shadow_probability": None,
+            "shadow_model_version": None,
+        }
+        for (_, feat_summary, _), language in zip(prepared, languages)
+    ]
+    rows = [feats for feats, _, _ in prepared]
+
+    with metrics.stage("inference"):
+        probs = primary.infer_batch(np.vstack(rows)) if rows else np.zeros(0)
+    offset = 0
+    for payload, (r, _, spans) in zip(payloads, prepared):
+        part = probs[offset : offset + len(r)]
+        offset += len(r)
+        if spans is None:
+            payload["probability"] = float(part[0])
+            continue
+        payload["probability"] = _aggregate(part)
+        payload["segments"] = [
+            {"start": start, "end": end, "probability": float(p)} for (start, end), p in zip(spans, part)
+        ]
+
+    if shadow is not None and rows:
+        try:
+            with metrics.stage("shadow_inference"):
+                same_schema = shadow.schema.version == schema.version
+                scores = _shadow_scores(shadow, rows if same_schema else shadow_rows(shadow.schema))
+        except Exception as e:
+            logger.warning("shadow model %s failed: %s", shadow.version, e)
+        else:
+            for payload, score in zip(payloads, scores):
+                payload["shadow_probability"] = score
+                payload["shadow_model_version"] = shadow.version
+    return payloads
+
+
+class StreamedText(NamedTuple):
+    """A document read past ``STREAM_FEATURES_MIN_CHARS``: everything scoring
+    needs from its cleaned text, without the text itself."""
+
+    digest: str
+    features: FeatureAccumulator
+    language_sample: str
+
+
+def _stripped(chunks: Iterable[str]) -> Iterator[str]:
+    """``chunks`` with the joined text's leading and trailing whitespace
+    dropped, as ``str.strip`` would."""
+    started = False
+    held = ""
+    for chunk in chunks:
+        if not started:
+            chunk = chunk.lstrip()
+            if not chunk:
+                continue
+            started = True
+        body = chunk.rstrip()
+        if body:
+            if held:
+                yield held
+            yield body
+            held = chunk[len(body) :]
+        else:
+            held += chunk
+
+
+def _read_document(key: str, schema: FeatureSchema) -> Union[str, StreamedText]:
+    """The cleaned text of ``key``, or a ``StreamedText`` once it outgrows
+    ``STREAM_FEATURES_MIN_CHARS``: from then on chunks are fed to a feature
+    accumulator, a content digest and a language sampler and dropped."""
+    settings = get_settings()
+    limit = 0 if settings.SEGMENTED_SCORING_ENABLED else settings.STREAM_FEATURES_MIN_CHARS
+    chunks = _stripped(iter_text(key))
+    held: List[str] = []
+    size = 0
+    for chunk in chunks:
+        held.append(chunk)
+        size += len(chunk)
+        if limit and size > limit:
+            break
+    else:
+        return "".join(held)
+
+    hasher = hashlib.sha256()
+    acc = FeatureAccumulator(schema=schema)
+    sampler = TextSampler(settings.LANGID_MAX_CHARS, settings.LANGID_SAMPLES)
+    pending = deque(held)
+    del held
+    # buffered chunks are released as they are consumed
+    for chunk in chain((pending.popleft() for _ in range(len(pending))), chunks):
+        hasher.update(chunk.encode("utf-8"))
+        acc.update(chunk)
+        sampler.update(chunk)
+    return StreamedText(hasher.hexdigest(), acc, sampler.sample())
+
+
+def _score_streamed(doc: StreamedText, models: Models) -> dict:
+    """``score_texts`` for one streamed document, never segmented."""
+    with metrics.stage("langdetect"):
+        language = detect_samples([doc.language_sample])[0]
+    with metrics.stage("features"):
+        feats, feat_summary = doc.features.finalize()
+    return _score_rows([(feats, feat_summary, None)], [language], models, lambda s: [doc.features.finalize(s)[0]])[0]
+
+
 def process_job(job_uuid: str) -> None:
     with get_sync_session() as session:
-        job: Job | None = session.scalar(select(Job).where(Job.job_uuid == job_uuid))
-        if not job:
+        row = session.execute(
+            select(Job, Document)
+            .outerjoin(Document, Document.id == Job.document_id)
+            .where(Job.job_uuid == job_uuid)
+        ).first()
+        if not row:
+            return
+        job, doc = row
+        if not doc:
+            job.status = "FAILED"
+            session.commit()
+            metrics.job_finished("failed")
+            job_events.publish(job.user_id, job_events.job_event(job.job_uuid, "FAILED"))
             return
+        metrics.observe_queue_wait(job.created_at)
         job.status = "RUNNING"
         session.commit()
+        job_events.publish(job.user_id, job_events.job_event(job.job_uuid, "RUNNING"))
 
-        doc: Document | None = session.get(Document, job.document_id)
-        if not doc:
+        try:
+            start = time.time()
+            models = current_models()
+            cache_key = cache_version(models)
+            with metrics.stage("read"):
+                document = _read_document(doc.s3_key, models[0].schema)
+            if isinstance(document, StreamedText):
+                digest = document.digest
+            else:
+                digest = result_cache.content_hash(document)
+            cached = result_cache.lookup(session, digest, cache_key)
+            if cached is not None:
+                payload = cached
+            elif isinstance(document, StreamedText):
+                payload = _score_streamed(document, models)
+            else:
+                stored = result_cache.lookup_features(session, [digest]).get(digest)
+                payload = score_texts([document], [stored], models)[0]
+
+            latency_ms = int((time.time() - start) * 1000)
+            model_version = models[0].version
+            result = Result(job_id=job.id, latency_ms=latency_ms, model_version=model_version, **payload)
+            # Result insert, result pointer and status update share one commit
+            with metrics.stage("db_write"):
+                session.add(result)
+                session.flush()
+                job.result_id = result.id
+                job.status = "SUCCEEDED"
+                session.commit()
+            metrics.job_finished("cached" if cached is not None else "succeeded")
+            event = {**payload, "model_version": model_version, "latency_ms": latency_ms}
+            job_events.publish(job.user_id, job_events.job_event(job.job_uuid, "SUCCEEDED", event))
+            if cached is None:
+                result_cache.store(session, digest, cache_key, payload)
+        except Exception:
+            session.rollback()
             job.status = "FAILED"
             session.commit()
+            metrics.job_finished("failed")
+            job_events.publish(job.user_id, job_events.job_event(job.job_uuid, "FAILED"))
+
+
+def _read_or_none(key: str, schema: FeatureSchema) -> Optional[Union[str, StreamedText]]:
+    try:
+        return _read_document(key, schema)
+    except Exception:
+        return None
+
+
+def process_jobs_batch(job_uuids: Sequence[str]) -> None:
+    """Process many jobs in one RQ invocation.
+
+    Jobs and documents are loaded with one query, texts are fetched
+    concurrently, features for all documents are scored as one matrix, and
+    results plus final statuses are written in a single commit. Documents
+    past ``STREAM_FEATURES_MIN_CHARS`` are streamed as in ``process_job`` and
+    scored one by one.
+    """
+    if not job_uuids:
+        return
+    settings = get_settings()
+    with get_sync_session() as session:
+        rows = session.execute(
+            select(Job, Document)
+            .outerjoin(Document, Document.id == Job.document_id)
+            .where(Job.job_uuid.in_(list(job_uuids)))
+        ).all()
+        if not rows:
+            return
+        for job, doc in rows:
+            job.status = "RUNNING" if doc else "FAILED"
+            if doc:
+                metrics.observe_queue_wait(job.created_at)
+        session.commit()
+        metrics.job_finished("failed", sum(1 for _, doc in rows if not doc))
+        job_events.publish_many(
+            (job.user_id, job_events.job_event(job.job_uuid, job.status)) for job, _ in rows
+        )
+        work = [(job, doc) for job, doc in rows if doc]
+        if not work:
             return
+        # plain values: a rollback expires the ORM objects
+        owners = {job.id: (job.user_id, job.job_uuid) for job, _ in work}
 
+        start = time.time()
+        statuses: List[dict] = []
         try:
-            start = time.time()
-            text = read_text(doc.s3_key)
-            cleaned = text.strip()
-            language = detect(cleaned) if cleaned else "unknown"
+            models = current_models()
+            cache_key = cache_version(models)
+            schema = models[0].schema
+            workers = max(1, min(len(work), settings.WORKER_FETCH_CONCURRENCY))
+            with ThreadPoolExecutor(max_workers=workers) as pool, metrics.stage("read"):
+                documents = list(pool.map(lambda key: _read_or_none(key, schema), [doc.s3_key for _, doc in work]))
 
-            feats, feat_summary = extract_features(cleaned)
-            ai_probability = infer(feats)
+            fetched: List[Tuple[Job, str]] = []
+            cleaned_by_digest: Dict[str, str] = {}
+            streamed: Dict[str, StreamedText] = {}
+            for (job, _), document in zip(work, documents):
+                if document is None:
+                    statuses.append({"id": job.id, "status": "FAILED"})
+                    continue
+                if isinstance(document, StreamedText):
+                    digest = document.digest
+                    streamed[digest] = document
+                else:
+                    digest = result_cache.content_hash(document)
+                    cleaned_by_digest[digest] = document
+                fetched.append((job, digest))
+
+            # Identical documents, in this batch or seen before, are scored once
+            payloads = result_cache.lookup_many(session, [*cleaned_by_digest, *streamed], cache_key)
+            fresh: Dict[str, dict] = {}
+            misses = [d for d in cleaned_by_digest if d not in payloads]
+            if misses:
+                stored = result_cache.lookup_features(session, misses)
+                fresh = dict(
+                    zip(
+                        misses,
+                        score_texts([cleaned_by_digest[d] for d in misses], [stored.get(d) for d in misses], models),
+                    )
+                )
+            for digest, document in streamed.items():
+                if digest not in payloads:
+                    fresh[digest] = _score_streamed(document, models)
+            payloads.update(fresh)
 
             latency_ms = int((time.time() - start) * 1000)
-            result = Result(
-                job_id=job.id,
-                probability=ai_probability,
-                summary=f"lang={language}",
-                feature_summary=str(feat_summary),
-                latency_ms=latency_ms,
+            model_version = models[0].version
+            results = [
+                {"job_id": job.id, "latency_ms": latency_ms, "model_version": model_version, **payloads[digest]}
+                for job, digest in fetched
+            ]
+            with metrics.stage("db_write"):
+                result_ids = []
+                if results:
+                    result_ids = session.scalars(
+                        insert(Result).returning(Result.id, sort_by_parameter_order=True), results
+                    ).all()
+                succeeded = [
+                    {"id": job.id, "status": "SUCCEEDED", "result_id": result_id}
+                    for (job, _), result_id in zip(fetched, result_ids)
+                ]
+                # bulk UPDATE by primary key needs one key set per statement
+                for params in (statuses, succeeded):
+                    if params:
+                        session.execute(update(Job), params)
+                session.commit()
+            metrics.job_finished("failed", len(statuses))
+            metrics.job_finished("cached", sum(1 for _, digest in fetched if digest not in fresh))
+            metrics.job_finished("succeeded", sum(1 for _, digest in fetched if digest in fresh))
+            statuses.extend(succeeded)
+            by_job = {r["job_id"]: r for r in results}
+            job_events.publish_many(
+                (owners[s["id"]][0], job_events.job_event(owners[s["id"]][1], s["status"], by_job.get(s["id"])))
+                for s in statuses
             )
-            session.add(result)
-            job.status = "SUCCEEDED"
-            session.commit()
+            result_cache.store_many(session, fresh, cache_key)
         except Exception:
-            job.status = "FAILED"
+            session.rollback()
+            session.execute(update(Job), [{"id": job_id, "status": "FAILED"} for job_id in owners])
             session.commit()
+            metrics.job_finished("failed", len(owners))
+            job_events.publish_many(
+                (user_id, job_events.job_event(job_uuid, "FAILED")) for user_id, job_uuid in owners.values()
+            )
 
 
+def drain_pending_jobs() -> None:
+    """Flush every buffered job id into batch tasks (scheduled by enqueue_job_batched)."""
+    from ..services.queue import flush_pending_jobs
+
+    while flush_pending_jobs():
+        pass
+
+
+def purge_result_cache() -> int:
+    """Drop expired result-cache rows; meant to be scheduled periodically."""
+    with get_sync_session() as session:
+        return result_cache.purge_expired(session)
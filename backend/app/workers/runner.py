@@ -1,18 +1,75 @@
-from rq import Worker, Queue, Connection
+from rq import Worker, Queue, Connection, SimpleWorker
+from rq.worker_pool import WorkerPool
 import redis
 
 from ..config import get_settings
+from ..models.langid import get_backend as get_language_backend
+from ..models.onnx_runner import current_models, warmup
+from ..services.metrics import start_worker_server
+
+
+def preload() -> None:
+    """Load everything a job needs once per worker process."""
+    from ..repos.db import get_sync_engine
+    from ..services.storage import get_s3_client
+
+    settings = get_settings()
+    warmup(batch_size=settings.JOB_BATCH_SIZE)
+    get_language_backend()
+    get_sync_engine()
+    if settings.S3_BUCKET and not settings.ENABLE_STORAGE_STUB:
+        get_s3_client()
+
+
+class PreloadedWorker(SimpleWorker):
+    """Non-forking worker that preloads shared state before taking jobs."""
+
+    def work(self, *args, **kwargs):
+        preload()
+        return super().work(*args, **kwargs)
+
+
+class ModelReloadingWorker(Worker):
+    """Forking worker that picks up new model files before each fork.
+
+    The registry is checked in the parent, so work-horses inherit a swapped
+    model instead of each loading it again for their single job.
+    """
+
+    def execute_job(self, job, queue):
+        current_models()
+        return super().execute_job(job, queue)
 
 
 def main() -> None:
     settings = get_settings()
     conn = redis.from_url(settings.REDIS_URL)
+    if settings.WORKER_METRICS_PORT:
+        # one endpoint per host: aggregates forked work-horses and pool
+        # workers through PROMETHEUS_MULTIPROC_DIR
+        start_worker_server(settings.WORKER_METRICS_PORT)
+    if settings.WORKER_MODE.lower() == "inprocess":
+        if settings.WORKER_CONCURRENCY > 1:
+            pool = WorkerPool(
+                ["jobs"],
+                connection=conn,
+                num_workers=settings.WORKER_CONCURRENCY,
+                worker_class=PreloadedWorker,
+            )
+            pool.start(burst=False)
+        else:
+            worker = PreloadedWorker([Queue("jobs", connection=conn)], connection=conn)
+            worker.work(with_scheduler=True)
+        return
+
+    # Load the model and language profiles before taking work so forked
+    # work-horses inherit them
+    warmup(batch_size=settings.JOB_BATCH_SIZE)
+    get_language_backend()
     with Connection(conn):
-        worker = Worker([Queue("jobs")])
-        worker.work()
+        worker = ModelReloadingWorker([Queue("jobs")])
+        worker.work(with_scheduler=True)
 
 
 if __name__ == "__main__":
     main()
-
-
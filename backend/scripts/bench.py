@@ -0,0 +1,360 @@
+"""Benchmarks for the detection pipeline.
+
+    python -m scripts.bench --out bench.json
+    python -m scripts.bench --quick --baseline bench.json
+
+Measures per-stage timings on synthetic texts of controlled size, end-to-end
+worker throughput (sqlite + fakeredis) and API latency through an in-process
+client. Every figure is in milliseconds, lower is better, so two runs compare
+key by key; ``--baseline`` exits non-zero when a p50 regresses by more than
+``--threshold``.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import uuid
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+from unittest import mock
+
+import numpy as np
+
+Stats = Dict[str, float]
+
+_SIZES = {"KB": 1024, "MB": 1024 * 1024}
+_WORDS = (
+    "the of and to in is that it was for on are as with his they at be this from have or by one had "
+    "not but what all were when we there can an your which their said if do will each about how up out "
+    "them then she many some so these would other into has more her two like him see time could no make "
+    "than first been its who now people my made over did down only way find use may water long little very "
+    "after words called just where most know get through back much before go good new write our used me man "
+    "too any day same right look think also around another came come work three word must because does part "
+    "model language detection student essay research analysis result method system data network sample"
+).split()
+
+
+def parse_size(label: str) -> int:
+    label = label.strip().upper()
+    for suffix, mult in _SIZES.items():
+        if label.endswith(suffix):
+            return int(float(label[: -len(suffix)]) * mult)
+    return int(label)
+
+
+def make_text(size: int, seed: int = 0) -> str:
+    """Deterministic English-like text of about ``size`` bytes."""
+    rng = random.Random(seed)
+    parts: List[str] = []
+    total = 0
+    while total < size:
+        words = [rng.choice(_WORDS) for _ in range(rng.randint(5, 25))]
+        words[0] = words[0].capitalize()
+        if rng.random() < 0.2:
+            words.insert(rng.randrange(len(words)), str(rng.randint(1, 2024)))
+        if rng.random() < 0.3:
+            words[rng.randrange(len(words) - 1)] += ","
+        sentence = " ".join(words) + rng.choice(".....!?")
+        if rng.random() < 0.1:
+            sentence += "\n\n"
+        parts.append(sentence)
+        total += len(sentence) + 1
+    return " ".join(parts)[:size]
+
+
+def summarize(samples_ms: Sequence[float]) -> Stats:
+    arr = np.asarray(samples_ms, dtype=np.float64)
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+    return {
+        "n": int(arr.size),
+        "min": round(float(arr.min()), 4),
+        "mean": round(float(arr.mean()), 4),
+        "p50": round(float(p50), 4),
+        "p95": round(float(p95), 4),
+        "p99": round(float(p99), 4),
+    }
+
+
+def measure(fn: Callable[[], Any], min_time: float = 0.2, max_runs: int = 200) -> Stats:
+    """Run ``fn`` at least once and until ``min_time`` seconds or ``max_runs`` runs."""
+    samples: List[float] = []
+    deadline = time.perf_counter() + min_time
+    while not samples or (len(samples) < max_runs and time.perf_counter() < deadline):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+
+def bench_stages(sizes: Sequence[str], min_time: float) -> Dict[str, Stats]:
+    from app.models.features import _sentences, _tokenize, extract_features
+    from app.models.langid import detect_language, get_backend
+
+    get_backend()  # profile loading would otherwise land in the first sample
+
+    def ngrams(tokens: List[str]) -> Tuple[int, int]:
+        return len(set(zip(tokens, tokens[1:]))), len(set(zip(tokens, tokens[1:], tokens[2:])))
+
+    out: Dict[str, Stats] = {}
+    for label in sizes:
+        text = make_text(parse_size(label))
+        tokens = _tokenize(text)
+        stages = {
+            "tokenize": lambda: _tokenize(text),
+            "sentences": lambda: _sentences(text),
+            "ngrams": lambda: ngrams(tokens),
+            "features": lambda: extract_features(text),
+            "langdetect": lambda: detect_language(text),
+        }
+        for name, fn in stages.items():
+            out[f"stage.{name}.{label}"] = measure(fn, min_time)
+    return out
+
+
+def bench_inference(min_time: float) -> Dict[str, Stats]:
+    from app.models.onnx_runner import infer, infer_batch, warmup
+
+    warmup(64)
+    rng = np.random.default_rng(0)
+    one = rng.random((1, 10), dtype=np.float32)
+    batch = rng.random((64, 10), dtype=np.float32)
+    return {
+        "infer.single": measure(lambda: infer(one), min_time),
+        "infer.batch64": measure(lambda: infer_batch(batch), min_time),
+    }
+
+
+def _make_jobs(engine, keys: Sequence[str]) -> List[str]:
+    from sqlalchemy.orm import Session
+
+    from app.repos.models import Document, Job, User
+
+    with Session(engine) as session:
+        user = User(uid=str(uuid.uuid4()))
+        session.add(user)
+        session.flush()
+        docs = [Document(user_id=user.id, s3_key=key) for key in keys]
+        session.add_all(docs)
+        session.flush()
+        job_uuids = [str(uuid.uuid4()) for _ in keys]
+        session.add_all(
+            Job(job_uuid=job_uuid, user_id=user.id, document_id=doc.id, status="PENDING")
+            for job_uuid, doc in zip(job_uuids, docs)
+        )
+        session.commit()
+    return job_uuids
+
+
+def bench_worker(n_jobs: int, text_size: str) -> Dict[str, Stats]:
+    import fakeredis
+
+    from app.config import Settings
+    from app.repos.db import Base, get_sync_engine
+    from app.services import job_events, result_cache
+    from app.workers import rq_tasks
+
+    size = parse_size(text_size)
+    # distinct texts, cache off: every job is scored
+    texts = {f"bench/{i}.txt": make_text(size, seed=i) for i in range(2 * n_jobs)}
+    keys = list(texts)
+    fake = fakeredis.FakeRedis()
+    with tempfile.TemporaryDirectory() as tmp, ExitStack() as stack:
+        url = f"sqlite+aiosqlite:///{tmp}/bench.db"
+        settings = Settings(DB_URL=url, RESULT_CACHE_ENABLED=False)
+        for target, name, value in (
+            (rq_tasks, "get_settings", lambda: settings),
+            (result_cache, "get_settings", lambda: settings),
+            (rq_tasks, "iter_text", lambda key: iter([texts[key]])),
+            (result_cache, "_get_redis", lambda: fake),
+            (job_events, "_get_redis", lambda: fake),
+        ):
+            stack.enter_context(mock.patch.object(target, name, value))
+        engine = get_sync_engine(url)
+        Base.metadata.create_all(bind=engine)
+
+        single = _make_jobs(engine, keys[:n_jobs])
+        samples = []
+        for job_uuid in single:
+            start = time.perf_counter()
+            rq_tasks.process_job(job_uuid)
+            samples.append((time.perf_counter() - start) * 1000)
+
+        batch = _make_jobs(engine, keys[n_jobs:])
+        start = time.perf_counter()
+        rq_tasks.process_jobs_batch(batch)
+        batch_ms = (time.perf_counter() - start) * 1000
+        engine.dispose()
+    return {
+        f"worker.process_job.{text_size}": summarize(samples),
+        f"worker.process_jobs_batch.per_job.{text_size}": summarize([batch_ms / n_jobs]),
+    }
+
+
+def bench_api(n_jobs: int, requests: int) -> Dict[str, Stats]:
+    import fakeredis
+    from fastapi.testclient import TestClient
+    from sqlalchemy import insert
+    from sqlalchemy.orm import Session
+
+    import app.repos.async_session as session_mod
+    from app.config import get_settings
+    from app.main import app
+    from app.repos.db import Base, get_sync_engine
+    from app.repos.models import Document, Job, Result, User
+    from app.services import queue
+    from app.services.auth import auth_dependency
+
+    async def bench_user():
+        return {"uid": "bench", "email": "bench@example.com"}
+
+    fake = fakeredis.FakeRedis()
+    saved_url = os.environ.get("DB_URL")
+    with tempfile.TemporaryDirectory() as tmp, ExitStack() as stack:
+        os.environ["DB_URL"] = f"sqlite+aiosqlite:///{tmp}/api.db"
+        get_settings.cache_clear()
+        session_mod._async_session_maker = None
+        stack.enter_context(mock.patch.object(queue, "_get_connection", lambda: fake))
+        app.dependency_overrides[auth_dependency] = bench_user
+        try:
+            engine = get_sync_engine()
+            Base.metadata.create_all(bind=engine)
+            with Session(engine) as session:
+                user = User(uid="bench")
+                session.add(user)
+                session.flush()
+                doc_ids = session.scalars(
+                    insert(Document).returning(Document.id, sort_by_parameter_order=True),
+                    [{"user_id": user.id, "s3_key": f"uploads/bench/{i}.txt"} for i in range(n_jobs)],
+                ).all()
+                job_uuids = [str(uuid.uuid4()) for _ in doc_ids]
+                job_ids = session.scalars(
+                    insert(Job).returning(Job.id, sort_by_parameter_order=True),
+                    [
+                        {"job_uuid": u, "user_id": user.id, "document_id": d, "status": "SUCCEEDED"}
+                        for u, d in zip(job_uuids, doc_ids)
+                    ],
+                ).all()
+                for job_id in job_ids:
+                    result = Result(job_id=job_id, probability=0.5, language="en", features={}, latency_ms=1)
+                    session.add(result)
+                    session.flush()
+                    session.get(Job, job_id).result_id = result.id
+                session.commit()
+
+            rng = random.Random(0)
+            calls = {
+                "api.list_jobs": lambda c: c.get("/api/jobs", params={"page_size": 20}),
+                "api.list_jobs.include_results": lambda c: c.get(
+                    "/api/jobs", params={"page_size": 20, "include_results": True}
+                ),
+                "api.get_job": lambda c: c.get(f"/api/jobs/{rng.choice(job_uuids)}"),
+                "api.create_job": lambda c: c.post("/api/jobs", json={"s3_key": "uploads/bench/new.txt"}),
+            }
+            out: Dict[str, Stats] = {}
+            with TestClient(app) as client:
+                for name, call in calls.items():
+                    call(client)  # warm up
+                    samples = []
+                    for _ in range(requests):
+                        start = time.perf_counter()
+                        resp = call(client)
+                        samples.append((time.perf_counter() - start) * 1000)
+                        resp.raise_for_status()
+                    out[name] = summarize(samples)
+            engine.dispose()
+            return out
+        finally:
+            app.dependency_overrides.pop(auth_dependency, None)
+            if saved_url is None:
+                os.environ.pop("DB_URL", None)
+            else:
+                os.environ["DB_URL"] = saved_url
+            get_settings.cache_clear()
+            session_mod._async_session_maker = None
+
+
+def compare(
+    current: Dict[str, Stats], baseline: Dict[str, Stats], threshold: float, min_delta_ms: float
+) -> List[Tuple[str, float, float, float]]:
+    """Keys whose p50 grew by more than ``threshold`` (and ``min_delta_ms``)."""
+    regressions = []
+    for key in sorted(current.keys() & baseline.keys()):
+        base, cur = baseline[key]["p50"], current[key]["p50"]
+        if base > 0 and cur > base * (1 + threshold) and cur - base > min_delta_ms:
+            regressions.append((key, base, cur, cur / base))
+    return regressions
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    if args.sizes:
+        sizes = args.sizes.split(",")
+    else:
+        sizes = ["1KB", "10KB", "100KB"] if args.quick else ["1KB", "10KB", "100KB", "1MB", "10MB"]
+    results: Dict[str, Stats] = {}
+    if "stages" in args.suites:
+        results.update(bench_stages(sizes, args.min_time))
+    if "inference" in args.suites:
+        results.update(bench_inference(args.min_time))
+    if "worker" in args.suites:
+        results.update(bench_worker(args.jobs, args.worker_text))
+    if "api" in args.suites:
+        results.update(bench_api(args.jobs, args.requests))
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "sizes": sizes,
+        },
+        "results": results,
+    }
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suites", default="stages,inference,worker,api")
+    parser.add_argument("--sizes", help="comma-separated text sizes, e.g. 1KB,1MB,10MB")
+    parser.add_argument("--quick", action="store_true", help="texts up to 100KB, fewer jobs and requests")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds spent per stage measurement")
+    parser.add_argument("--jobs", type=int, default=None, help="jobs per worker run / seeded for the API")
+    parser.add_argument("--worker-text", default="10KB", help="text size for worker jobs")
+    parser.add_argument("--requests", type=int, default=None, help="requests per API endpoint")
+    parser.add_argument("--out", help="write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed p50 slowdown, 0.2 = 20%%")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="ignore smaller absolute slowdowns")
+    args = parser.parse_args(argv)
+    args.suites = set(args.suites.split(","))
+    args.jobs = args.jobs or (10 if args.quick else 50)
+    args.requests = args.requests or (20 if args.quick else 200)
+
+    report = run(args)
+    payload = json.dumps(report, indent=2, sort_keys=True)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    regressions = compare(report["results"], baseline, args.threshold, args.min_delta_ms)
+    for key, base, cur, ratio in regressions:
+        print(f"REGRESSION {key}: p50 {base:.3f}ms -> {cur:.3f}ms ({ratio:.2f}x)", file=sys.stderr)
+    if not regressions:
+        print(f"no regressions against {args.baseline}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
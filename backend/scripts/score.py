@@ -0,0 +1,289 @@
+"""Offline bulk scoring, bypassing the API, the queue and the jobs tables.
+
+    python -m scripts.score corpus/ --out scores/
+    python -m scripts.score archive.jsonl --out scores/ --format parquet --workers 16
+    python -m scripts.score s3://bucket/uploads/ --out scores/
+
+Documents come from a directory (every file, recursively; id = relative
+path), a JSONL file (``--text-field``, id from ``--id-field`` or the line
+number) or an S3 prefix (id = key). The source is cut into ``--chunk-size``
+chunks in a stable order. Each chunk is loaded, scored and written as its own
+part file by a worker process, scored exactly as the RQ worker scores a
+document, so the parent only lists documents and throughput grows with
+``--workers``. Part files appear atomically: rerunning an interrupted run with
+the same arguments skips the chunks already written. Parquet output needs
+pyarrow.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from app.config import get_settings
+from app.models.langid import get_backend
+from app.models.onnx_runner import current_models, warmup
+from app.services.storage import DocumentTooLarge, get_s3_client
+from app.workers.rq_tasks import score_texts, scoring_mode
+
+Ref = Tuple[str, str]
+
+_MANIFEST = "_manifest.json"
+_STRING_COLUMNS = {"id", "language", "model_version", "feature_schema", "segments", "shadow_model_version", "error"}
+# set per worker process by _init_worker
+_spec: Dict[str, Any] = {}
+
+
+def source_kind(source: str) -> str:
+    if source.startswith("s3://"):
+        return "s3"
+    if os.path.isdir(source):
+        return "dir"
+    if os.path.isfile(source):
+        return "jsonl"
+    raise ValueError(f"{source} is not a directory, a JSONL file or an s3:// prefix")
+
+
+def _split_s3(source: str) -> Tuple[str, str]:
+    bucket, _, prefix = source[len("s3://") :].partition("/")
+    return bucket, prefix
+
+
+def iter_refs(source: str, kind: str) -> Iterator[Ref]:
+    """``(id, ref)`` per document in a stable order; workers turn refs into text.
+
+    For JSONL the ref is the raw line, so parsing happens in the workers too.
+    """
+    if kind == "dir":
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                rel = os.path.relpath(os.path.join(root, name), source).replace(os.sep, "/")
+                yield rel, rel
+    elif kind == "jsonl":
+        with open(source, encoding="utf-8") as f:
+            for lineno, line in enumerate(f, 1):
+                if line.strip():
+                    yield str(lineno), line
+    else:
+        bucket, prefix = _split_s3(source)
+        pages = get_s3_client().get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix)
+        for page in pages:
+            for obj in page.get("Contents", ()):
+                if not obj["Key"].endswith("/"):
+                    yield obj["Key"], obj["Key"]
+
+
+def _load(doc_id: str, ref: str) -> Tuple[str, str]:
+    kind, source = _spec["kind"], _spec["source"]
+    limit = get_settings().STORAGE_MAX_BYTES
+    if kind == "jsonl":
+        obj = json.loads(ref)
+        text = obj[_spec["text_field"]]
+        if not isinstance(text, str):
+            raise ValueError(f"{_spec['text_field']!r} is not a string")
+        if _spec["id_field"] and obj.get(_spec["id_field"]) is not None:
+            doc_id = str(obj[_spec["id_field"]])
+        return doc_id, text
+    if kind == "dir":
+        path = os.path.join(source, ref)
+        if limit and os.path.getsize(path) > limit:
+            raise DocumentTooLarge(f"{ref} is larger than {limit} bytes")
+        with open(path, encoding="utf-8", errors="replace") as f:
+            return doc_id, f.read()
+    obj = get_s3_client().get_object(Bucket=_split_s3(source)[0], Key=ref)
+    if limit and (obj.get("ContentLength") or 0) > limit:
+        raise DocumentTooLarge(f"{ref} is {obj['ContentLength']} bytes, limit is {limit}")
+    return doc_id, obj["Body"].read().decode("utf-8", errors="replace")
+
+
+def columns(feature_names: Sequence[str]) -> List[str]:
+    return [
+        "id",
+        "probability",
+        "language",
+        "model_version",
+        "feature_schema",
+        *feature_names,
+        "segments",
+        "shadow_probability",
+        "shadow_model_version",
+        "error",
+    ]
+
+
+def _write_part(path: str, rows: List[Dict[str, Any]], cols: List[str], fmt: str) -> None:
+    tmp = f"{path}.tmp"
+    if fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        pq.write_table(pa.Table.from_pylist(rows, schema=_arrow_schema(cols)), tmp)
+    else:
+        with open(tmp, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=cols)
+            writer.writeheader()
+            writer.writerows(rows)
+    os.replace(tmp, path)
+
+
+def _arrow_schema(cols: List[str]):
+    import pyarrow as pa
+
+    return pa.schema([(c, pa.string() if c in _STRING_COLUMNS else pa.float64()) for c in cols])
+
+
+def part_path(out: str, index: int, fmt: str) -> str:
+    return os.path.join(out, f"part-{index:06d}.{fmt}")
+
+
+def score_chunk(index: int, refs: Sequence[Ref]) -> Tuple[int, int, int]:
+    """Load, score and write one chunk; returns ``(index, documents, failures)``."""
+    models = current_models()
+    rows: List[Dict[str, Any]] = []
+    loaded: List[Tuple[Dict[str, Any], str]] = []
+    for doc_id, ref in refs:
+        row: Dict[str, Any] = {"id": doc_id}
+        try:
+            row["id"], text = _load(doc_id, ref)
+            loaded.append((row, text.strip()))
+        except Exception as e:
+            row["error"] = f"{type(e).__name__}: {e}"
+        rows.append(row)
+
+    for (row, _), payload in zip(loaded, score_texts([text for _, text in loaded], models=models)):
+        row.update(payload["features"])
+        for field in ("probability", "language", "feature_schema", "shadow_probability", "shadow_model_version"):
+            row[field] = payload[field]
+        row["model_version"] = models[0].version
+        if payload["segments"] is not None:
+            row["segments"] = json.dumps(payload["segments"])
+    cols = columns(models[0].schema.names)
+    _write_part(part_path(_spec["out"], index, _spec["format"]), rows, cols, _spec["format"])
+    return index, len(rows), len(rows) - len(loaded)
+
+
+def _init_worker(spec: Dict[str, Any]) -> None:
+    """Process setup: single-threaded inference, model and language profiles loaded once."""
+    _spec.clear()
+    _spec.update(spec)
+    if spec.get("threads"):
+        os.environ["ORT_INTRA_OP_THREADS"] = os.environ["ORT_INTER_OP_THREADS"] = str(spec["threads"])
+        get_settings.cache_clear()
+    warmup()
+    get_backend()
+
+
+def chunked(refs: Iterable[Ref], size: int) -> Iterator[List[Ref]]:
+    it = iter(refs)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+
+def _check_manifest(out: str, manifest: Dict[str, Any]) -> Set[int]:
+    """Indexes of chunks already written by a run with the same settings."""
+    path = os.path.join(out, _MANIFEST)
+    if os.path.exists(path):
+        with open(path) as f:
+            previous = json.load(f)
+        if previous != manifest:
+            raise SystemExit(f"{out} holds a run with different settings ({previous}); use another --out")
+    else:
+        os.makedirs(out, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+    suffix = f".{manifest['format']}"
+    return {int(name[5:-len(suffix)]) for name in os.listdir(out) if name.startswith("part-") and name.endswith(suffix)}
+
+
+def run(args: argparse.Namespace) -> Dict[str, int]:
+    kind = source_kind(args.source)
+    primary, shadow = current_models()
+    manifest = {
+        "source": args.source,
+        "chunk_size": args.chunk_size,
+        "format": args.format,
+        "text_field": args.text_field,
+        "id_field": args.id_field,
+        "model_version": primary.version,
+        "feature_schema": primary.schema.version,
+        "shadow_model_version": shadow.version if shadow is not None else None,
+        "scoring_mode": scoring_mode(),
+    }
+    done = _check_manifest(args.out, manifest)
+    spec = {**manifest, "kind": kind, "out": args.out, "threads": args.threads_per_worker}
+    totals = {"documents": 0, "failed": 0, "chunks": 0, "skipped_chunks": 0}
+    start = time.perf_counter()
+
+    def report(index: int, n: int, failed: int) -> None:
+        totals["documents"] += n
+        totals["failed"] += failed
+        totals["chunks"] += 1
+        rate = totals["documents"] / max(time.perf_counter() - start, 1e-9)
+        print(f"chunk {index}: {n} documents, {failed} failed ({rate:.0f} docs/s)", file=sys.stderr)
+
+    def chunks_todo() -> Iterator[Tuple[int, List[Ref]]]:
+        for index, refs in enumerate(chunked(iter_refs(args.source, kind), args.chunk_size)):
+            if index in done:
+                totals["skipped_chunks"] += 1
+            else:
+                yield index, refs
+
+    if args.workers <= 1:
+        _init_worker({**spec, "threads": 0})
+        for index, refs in chunks_todo():
+            report(*score_chunk(index, refs))
+        return totals
+
+    # spawn: a forked child would inherit the parent's inference threads
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(args.workers, mp_context=context, initializer=_init_worker, initargs=(spec,)) as pool:
+        pending: Set[Future] = set()
+        for index, refs in chunks_todo():
+            pending.add(pool.submit(score_chunk, index, refs))
+            # bounded read-ahead keeps memory flat on large sources
+            if len(pending) >= 2 * args.workers:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    report(*future.result())
+        for future in wait(pending).done:
+            report(*future.result())
+    return totals
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="directory, JSONL file or s3://bucket/prefix")
+    parser.add_argument("--out", required=True, help="output directory for part files and the checkpoint manifest")
+    parser.add_argument("--format", choices=("csv", "parquet"), default="csv")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="scoring processes (1: in-process)")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="documents per part file")
+    parser.add_argument("--threads-per-worker", type=int, default=1, help="inference threads per process")
+    parser.add_argument("--text-field", default="text", help="JSONL field holding the text")
+    parser.add_argument(
+        "--id-field", default="id", help="JSONL field holding the id; the line number when a record lacks it"
+    )
+    args = parser.parse_args(argv)
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be positive")
+    if args.format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error("--format parquet needs pyarrow installed")
+
+    totals = run(args)
+    # documents that failed to load are rows with ``error`` set, not a failed run
+    print(json.dumps(totals, sort_keys=True))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
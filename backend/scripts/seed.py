@@ -3,18 +3,14 @@ from __future__ import annotations
 import os
 import uuid
 
-from sqlalchemy import create_engine
 from sqlalchemy.orm import Session
 
 from app.repos.models import User, Document, Job, Result
-from app.repos.db import Base
-from app.config import get_settings
+from app.repos.db import Base, get_sync_engine
 
 
 def main() -> None:
-    settings = get_settings()
-    sync_url = settings.DB_URL.replace("+asyncpg", "+psycopg").replace("+aiosqlite", "+pysqlite")
-    engine = create_engine(sync_url, future=True)
+    engine = get_sync_engine()
     Base.metadata.create_all(bind=engine)
 
     with Session(engine) as session:
@@ -31,8 +27,12 @@ def main() -> None:
         session.add(job)
         session.flush()
 
-        res = Result(job_id=job.id, probability=0.73, summary="lang=en", feature_summary="{}", latency_ms=120)
+        res = Result(
+            job_id=job.id, probability=0.73, summary="lang=en", language="en", features={}, latency_ms=120
+        )
         session.add(res)
+        session.flush()
+        job.result_id = res.id
 
         session.commit()
         print({"user": user.email, "job": job_uuid})
@@ -0,0 +1,12 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def reset_queue_connection():
+    # services.queue caches its Redis client and Queue objects per process;
+    # tests swap in fakes, so start and end each test without a cached client.
+    from app.services import queue
+
+    queue.reset_connection()
+    yield
+    queue.reset_connection()
@@ -19,7 +19,7 @@ def setup_env(tmp_path, monkeypatch):
 
     fake = fakeredis.FakeRedis()
     import app.services.queue as queue_mod
-    monkeypatch.setattr(queue_mod, "redis", types.SimpleNamespace(from_url=lambda url: fake))
+    monkeypatch.setattr(queue_mod, "redis", types.SimpleNamespace(from_url=lambda url, **kw: fake))
     yield
 
 
@@ -70,3 +70,119 @@ def test_permission_isolation(auth_user):
     assert r3.status_code in (403, 404)
 
 
+
+
+@pytest.fixture
+def signing_key(monkeypatch):
+    import asyncio
+    import datetime
+
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+
+    from app.config import Settings
+    from app.services import auth as auth_mod
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "test")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(1)
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    cert_pem = cert.public_bytes(serialization.Encoding.PEM).decode()
+    key_pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+
+    fetches = []
+
+    async def fake_fetch(self):
+        fetches.append(1)
+        await asyncio.sleep(0.01)
+        return {"other": cert_pem, "k1": cert_pem}, 600
+
+    settings = Settings(FIREBASE_PROJECT_ID="proj")
+    monkeypatch.setattr(auth_mod, "get_settings", lambda: settings)
+    monkeypatch.setattr(auth_mod.JWKsCache, "_fetch", fake_fetch)
+    monkeypatch.setattr(auth_mod, "_jwks_cache", auth_mod.JWKsCache())
+    monkeypatch.setattr(auth_mod, "_token_cache", auth_mod.VerifiedTokenCache(100))
+    return key_pem, fetches
+
+
+def _token(key_pem, kid="k1", sub="u1", exp_in=3600):
+    import time
+
+    from jose import jwt
+
+    now = int(time.time())
+    claims = {
+        "sub": sub,
+        "aud": "proj",
+        "iss": "https://securetoken.google.com/proj",
+        "iat": now,
+        "exp": now + exp_in,
+    }
+    return jwt.encode(claims, key_pem, algorithm="RS256", headers={"kid": kid})
+
+
+def test_verify_token_uses_kid_and_caches_claims(signing_key, monkeypatch):
+    import asyncio
+
+    from fastapi import HTTPException
+
+    from app.services import auth as auth_mod
+
+    key_pem, fetches = signing_key
+    decodes = []
+    real_decode = auth_mod.jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        decodes.append(args[1])
+        return real_decode(*args, **kwargs)
+
+    monkeypatch.setattr(auth_mod.jwt, "decode", counting_decode)
+    token = _token(key_pem)
+
+    async def run():
+        # concurrent first requests share one key fetch
+        infos = await asyncio.gather(*(auth_mod.verify_firebase_token(token) for _ in range(5)))
+        assert {i["uid"] for i in infos} == {"u1"}
+        assert len(fetches) == 1
+        # the kid selects one pre-parsed key; repeats hit the claims cache
+        decodes_before = len(decodes)
+        await auth_mod.verify_firebase_token(token)
+        assert len(decodes) == decodes_before
+        assert all(d is auth_mod._jwks_cache._keys["k1"] for d in decodes)
+
+        with pytest.raises(HTTPException) as err:
+            await auth_mod.verify_firebase_token(_token(key_pem, kid="nope"))
+        assert err.value.status_code == 401
+        # unknown kids do not refetch more than once per AUTH_KEYS_MIN_REFRESH_SECONDS
+        assert len(fetches) == 1
+
+    asyncio.run(run())
+
+
+def test_verified_token_cache_expires_and_evicts(monkeypatch):
+    import time
+
+    from app.services.auth import VerifiedTokenCache
+
+    cache = VerifiedTokenCache(2)
+    cache.put("a", time.time() + 60, {"uid": "a"})
+    cache.put("b", time.time() - 1, {"uid": "b"})
+    assert cache.get("b") is None
+    cache.put("c", time.time() + 60, {"uid": "c"})
+    assert cache.get("a") == {"uid": "a"}
+    cache.put("d", time.time() + 60, {"uid": "d"})
+    assert cache.get("c") is None
+    assert cache.get("a") == {"uid": "a"}
@@ -0,0 +1,44 @@
+from scripts import bench
+
+
+def test_make_text_is_deterministic_and_sized():
+    text = bench.make_text(bench.parse_size("2KB"), seed=3)
+    assert len(text) == 2048
+    assert text == bench.make_text(2048, seed=3)
+    assert text != bench.make_text(2048, seed=4)
+    assert bench.parse_size("1.5MB") == 1572864
+
+
+def test_compare_flags_only_real_regressions():
+    baseline = {
+        "a": bench.summarize([10.0]),
+        "b": bench.summarize([10.0]),
+        "tiny": bench.summarize([0.01]),
+        "gone": bench.summarize([1.0]),
+    }
+    current = {
+        "a": bench.summarize([11.0]),
+        "b": bench.summarize([13.0]),
+        "tiny": bench.summarize([0.03]),
+        "new": bench.summarize([1.0]),
+    }
+    regressions = bench.compare(current, baseline, threshold=0.2, min_delta_ms=0.05)
+    assert [r[0] for r in regressions] == ["b"]
+
+
+def test_stage_and_worker_benchmarks_report_ms(tmp_path, monkeypatch):
+    from app.workers import rq_tasks
+
+    results = bench.bench_stages(["1KB"], min_time=0.0)
+    assert {k.split(".")[1] for k in results} == {"tokenize", "sentences", "ngrams", "features", "langdetect"}
+
+    scored = []
+    real_extract = rq_tasks.extract_features
+    monkeypatch.setattr(rq_tasks, "extract_features", lambda text, *a: scored.append(text) or real_extract(text, *a))
+    results = bench.bench_worker(2, "1KB")
+    assert set(results) == {"worker.process_job.1KB", "worker.process_jobs_batch.per_job.1KB"}
+    # both worker paths score the synthetic corpus, not the storage stub
+    corpus = [bench.make_text(1024, seed=i).strip() for i in range(4)]
+    assert scored[:2] == corpus[:2]
+    assert sorted(scored[2:]) == sorted(corpus[2:])
+    assert results["worker.process_job.1KB"]["n"] == 2
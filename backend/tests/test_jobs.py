@@ -9,7 +9,7 @@ from fastapi.testclient import TestClient
 from app.main import app
 from app.config import get_settings
 from app.repos.db import Base
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, select
 
 
 @pytest.fixture(autouse=True)
@@ -24,7 +24,7 @@ def setup_env(tmp_path, monkeypatch):
     # Fake Redis
     fake = fakeredis.FakeRedis()
     import app.services.queue as queue_mod
-    monkeypatch.setattr(queue_mod, "redis", types.SimpleNamespace(from_url=lambda url: fake))
+    monkeypatch.setattr(queue_mod, "redis", types.SimpleNamespace(from_url=lambda url, **kw: fake))
 
     yield
 
@@ -71,3 +71,249 @@ def test_job_state_flow(tmp_path):
     assert r4.status_code == 200
 
 
+
+
+@pytest.fixture
+def fresh_app():
+    # Settings and the async session maker are process-wide caches; reset them
+    # so this test uses its own sqlite file, and override auth on the app.
+    import app.repos.async_session as session_mod
+    from app.api.jobs import auth_dependency
+
+    async def fake_dep():
+        return {"uid": "u1", "email": "u1@example.com"}
+
+    get_settings.cache_clear()
+    session_mod._async_session_maker = None
+    app.dependency_overrides[auth_dependency] = fake_dep
+    yield
+    app.dependency_overrides.clear()
+    get_settings.cache_clear()
+    session_mod._async_session_maker = None
+
+
+def test_create_jobs_batch(fresh_app):
+    from rq import Queue
+
+    import app.services.queue as queue_mod
+
+    client = TestClient(app)
+    files = [("files", (f"essay{i}.txt", b"Some essay text.", "text/plain")) for i in range(3)]
+    r = client.post("/api/jobs/batch", files=files)
+    assert r.status_code == 200
+    jobs = r.json()
+    assert [j["filename"] for j in jobs] == ["essay0.txt", "essay1.txt", "essay2.txt"]
+    assert all(j["status"] == "PENDING" and j["size_bytes"] == 16 for j in jobs)
+    assert len({j["document_id"] for j in jobs}) == 3
+
+    q = Queue("jobs", connection=queue_mod._get_connection())
+    queued = [q.fetch_job(jid).args[0] for jid in q.job_ids]
+    assert sorted(queued) == sorted(j["id"] for j in jobs)
+
+    r2 = client.get(f"/api/jobs/{jobs[0]['id']}")
+    assert r2.status_code == 200
+    assert r2.json()["status"] == "PENDING"
+
+
+def test_async_engine_registry_and_lifespan_dispose(fresh_app):
+    from app.repos import db as db_mod
+
+    engine = db_mod.get_async_engine()
+    assert engine is db_mod.get_async_engine()
+    assert db_mod.get_sync_engine().url.drivername == "sqlite+pysqlite"
+    with TestClient(app) as client:
+        assert client.get("/health").status_code == 200
+    # shutdown disposed the pool; the engine stays registered and usable
+    assert db_mod.get_async_engine() is engine
+
+
+def _sse_events(lines):
+    import json
+
+    return [json.loads(line[len("data: "):]) for line in lines if line.startswith("data: ")]
+
+
+def test_job_events_stream(fresh_app):
+    import json
+    import threading
+
+    from fakeredis import aioredis as fake_aioredis
+    from sqlalchemy.orm import Session
+
+    from app.repos.models import Document, Job, User
+    from app.services.job_events import JobEventHub, channel, job_event
+
+    server = fakeredis.FakeServer()
+    publisher = fakeredis.FakeRedis(server=server)
+    engine = create_engine(os.environ["DB_URL"].replace("+aiosqlite", "+pysqlite"), future=True)
+    with Session(engine) as session:
+        user = User(uid="u1", email="u1@example.com")
+        session.add(user)
+        session.flush()
+        doc = Document(user_id=user.id, s3_key="uploads/u1/a.txt")
+        session.add(doc)
+        session.flush()
+        session.add(Job(job_uuid="done-job", user_id=user.id, document_id=doc.id, status="SUCCEEDED"))
+        session.add(Job(job_uuid="live-job", user_id=user.id, document_id=doc.id, status="PENDING"))
+        session.commit()
+        user_id = user.id
+
+    with TestClient(app) as client:
+        app.state.job_events = JobEventHub(fake_aioredis.FakeRedis(server=server))
+
+        # a finished job: current state only, then the stream ends
+        with client.stream("GET", "/api/jobs/events", params={"job_id": "done-job"}) as r:
+            assert r.headers["content-type"].startswith("text/event-stream")
+            assert _sse_events(r.iter_lines()) == [{"id": "done-job", "status": "SUCCEEDED"}]
+
+        def publish_when_subscribed():
+            while not publisher.pubsub_numsub(channel(user_id))[0][1]:
+                time.sleep(0.01)
+            for status in ("RUNNING", "SUCCEEDED"):
+                publisher.publish(channel(user_id), json.dumps(job_event("other-job", status)))
+                publisher.publish(channel(user_id), json.dumps(job_event("live-job", status, {"probability": 0.5})))
+
+        t = threading.Thread(target=publish_when_subscribed)
+        t.start()
+        with client.stream("GET", "/api/jobs/events", params={"job_id": "live-job"}) as r:
+            events = _sse_events(r.iter_lines())
+        t.join()
+        assert [(e["id"], e["status"]) for e in events] == [
+            ("live-job", "PENDING"),
+            ("live-job", "RUNNING"),
+            ("live-job", "SUCCEEDED"),
+        ]
+        assert events[-1]["probability"] == 0.5
+
+        assert client.get("/api/jobs/events", params={"job_id": "missing"}).status_code == 404
+
+        # subscribing never creates the caller's user row
+        async def stranger():
+            return {"uid": "u2", "email": "u2@example.com"}
+
+        from app.api.jobs import auth_dependency
+
+        app.dependency_overrides[auth_dependency] = stranger
+        assert client.get("/api/jobs/events").status_code == 404
+        assert client.get("/api/jobs/events", params={"job_id": "live-job"}).status_code == 403
+    with Session(engine) as session:
+        assert session.scalars(select(User.uid)).all() == ["u1"]
+
+
+def test_job_events_initial_state_is_capped(fresh_app, monkeypatch):
+    import asyncio
+
+    from sqlalchemy.orm import Session
+
+    from app.api.jobs import _job_states
+    from app.repos.async_session import get_session_maker
+    from app.repos.models import Document, Job, User
+
+    monkeypatch.setenv("JOBS_MAX_PAGE_SIZE", "3")
+    get_settings.cache_clear()
+    engine = create_engine(os.environ["DB_URL"].replace("+aiosqlite", "+pysqlite"), future=True)
+    with Session(engine) as session:
+        user = User(uid="u1")
+        session.add(user)
+        session.flush()
+        doc = Document(user_id=user.id, s3_key="uploads/u1/a.txt")
+        session.add(doc)
+        session.flush()
+        session.add_all(
+            Job(job_uuid=f"job-{i}", user_id=user.id, document_id=doc.id, status="PENDING") for i in range(5)
+        )
+        session.commit()
+        user_id = user.id
+
+    async def states():
+        async with get_session_maker()() as session:
+            return await _job_states(session, user_id, None)
+
+    assert [e["id"] for e in asyncio.run(states())] == ["job-4", "job-3", "job-2"]
+
+
+def test_list_jobs_keyset_filters_and_results(fresh_app):
+    from sqlalchemy.orm import Session
+
+    from app.repos.models import Document, Job, Result, User
+
+    engine = create_engine(os.environ["DB_URL"].replace("+aiosqlite", "+pysqlite"), future=True)
+    with Session(engine) as session:
+        me, other = User(uid="u1"), User(uid="u2")
+        session.add_all([me, other])
+        session.flush()
+        for i, status in enumerate(["SUCCEEDED", "PENDING", "FAILED", "SUCCEEDED", "RUNNING"]):
+            doc = Document(user_id=me.id, s3_key=f"uploads/u1/{'0' * 36}_essay{i}.txt")
+            session.add(doc)
+            session.flush()
+            job = Job(job_uuid=f"job-{i}", user_id=me.id, document_id=doc.id, status=status)
+            session.add(job)
+            session.flush()
+            if status == "SUCCEEDED":
+                latest = Result(job_id=job.id, probability=0.1 * (i + 1), latency_ms=i)
+                session.add_all([Result(job_id=job.id, probability=0.1, latency_ms=5), latest])
+                session.flush()
+                job.result_id = latest.id
+        doc = Document(user_id=other.id, s3_key="uploads/u2/x.txt")
+        session.add(doc)
+        session.flush()
+        session.add(Job(job_uuid="job-other", user_id=other.id, document_id=doc.id, status="SUCCEEDED"))
+        session.commit()
+
+    client = TestClient(app)
+    seen, cursor = [], None
+    while True:
+        params = {"page_size": 2, **({"cursor": cursor} if cursor else {})}
+        body = client.get("/api/jobs", params=params).json()
+        assert len(body["items"]) <= 2
+        seen += [j["id"] for j in body["items"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == ["job-4", "job-3", "job-2", "job-1", "job-0"]
+
+    body = client.get("/api/jobs", params=[("status", "SUCCEEDED"), ("status", "FAILED,RUNNING")]).json()
+    assert [j["id"] for j in body["items"]] == ["job-4", "job-3", "job-2", "job-0"]
+    assert body["status"] == ["SUCCEEDED", "FAILED", "RUNNING"]
+
+    body = client.get("/api/jobs", params={"q": "ESSAY3", "include_results": True}).json()
+    assert body["items"] == [
+        {
+            "id": "job-3",
+            "status": "SUCCEEDED",
+            "created_at": body["items"][0]["created_at"],
+            "filename": "essay3.txt",
+            "probability": 0.4,
+            "latency_ms": 3,
+        }
+    ]
+    body = client.get("/api/jobs", params={"status": "PENDING", "include_results": True}).json()
+    assert body["items"][0]["probability"] is None
+    assert client.get("/api/jobs", params={"q": "job-1"}).json()["items"][0]["id"] == "job-1"
+
+    # get_job follows the job's result pointer and checks the owner's uid
+    assert client.get("/api/jobs/job-3").json() == {
+        "id": "job-3",
+        "status": "SUCCEEDED",
+        "probability": 0.4,
+        "summary": None,
+        "language": None,
+        "features": None,
+        "feature_schema": None,
+        "segments": None,
+        "model_version": None,
+        "latency_ms": 3,
+    }
+    assert client.get("/api/jobs/job-1").json() == {"id": "job-1", "status": "PENDING"}
+    assert client.get("/api/jobs/job-other").status_code == 403
+    assert client.get("/api/jobs/missing").status_code == 404
+
+
+def test_metrics_endpoint_reports_request_latency(fresh_app):
+    client = TestClient(app)
+    client.get("/health")
+    client.get("/api/jobs/does-not-exist")
+    body = client.get("/metrics").text
+    assert 'http_request_duration_seconds_count{method="GET",route="/health",status="200"}' in body
+    assert 'route="/api/jobs/{job_id}",status="404"' in body
+    assert "worker_stage_seconds" in body
@@ -1,6 +1,14 @@
+import os
+
 import numpy as np
+import pytest
 
-from app.models.features import extract_features
+from app.models.features import (
+    FeatureAccumulator,
+    extract_features,
+    extract_features_batch,
+    extract_window_features,
+)
 from app.models import onnx_runner
 
 
@@ -14,6 +22,126 @@ def test_extract_features_shape_and_values():
     assert 0.0 <= summary["stop_ratio"] <= 1.0
 
 
+def test_extract_features_batch_matches_single():
+    texts = [
+        "This is a simple sentence. It tests feature extraction! 123",
+        "",
+        "...",
+        "Repeat repeat repeat. Repeat repeat repeat.",
+        "no terminator here and the end",
+    ]
+    batch = extract_features_batch(texts)
+    assert batch.shape == (len(texts), 10)
+    assert batch.dtype == np.float32
+    for i, text in enumerate(texts):
+        feats, _ = extract_features(text)
+        assert batch[i].tobytes() == feats[0].tobytes()
+
+
+def test_ascii_scan_matches_regex_scan(monkeypatch):
+    import random
+
+    from app.models import features
+
+    rng = random.Random(0)
+    words = ["The", "and", "it's", "OF", "x", "'", "don't", "Hello", "42", "a-b"]
+    texts = ["", "...", "  .", " \t\n", "a", "'", ". a", "a.b!c?", "the the THE. the", "Ünïcode is skipped"]
+    texts += [" ".join(rng.choice(words) + rng.choice(["", ".", "!?", ",", "\n"]) for _ in range(n)) for n in range(60)]
+    texts.append(" ".join(rng.choice(words) for _ in range(5000)) + ".")
+    monkeypatch.setattr(features, "_ASCII_MIN_CHARS", 10**12)
+    expected = [features._scan(t) for t in texts]
+    monkeypatch.setattr(features, "_ASCII_MIN_CHARS", 0)
+    assert [features._scan(t) for t in texts] == expected
+
+
+def test_feature_schemas_version_caps_and_digit_ratios():
+    from app.models.feature_schema import CAPS, DIGITS, get_schema
+
+    text = "The Board met 3 times in 2024. It approved 12 Budgets!"
+    v1, v2 = get_schema("1"), get_schema("2")
+    assert v1.names == v2.names
+    old, old_summary = extract_features(text, v1)
+    new, new_summary = extract_features(text, v2)
+    assert old_summary["caps_ratio"] == old_summary["digit_ratio"] == 0.0
+    assert new_summary["caps_ratio"] == pytest.approx(4 / 8)
+    assert new_summary["digit_ratio"] == pytest.approx(3 / 11)
+    assert np.array_equal(old[0, :8], new[0, :8])
+    assert v1.needs >= v2.needs - {CAPS, DIGITS} and not v1.needs & {CAPS, DIGITS}
+
+    # stored values of features both schemas share are reused bit for bit
+    known = v2.reusable("1", old_summary)
+    assert set(known) == set(v2.names[:8])
+    assert v2.missing_needs(known) == {CAPS, DIGITS}
+    assert extract_features(text, v2, known)[0].tobytes() == new.tobytes()
+    assert v2.reusable("2", new_summary) == new_summary
+    assert v2.missing_needs(new_summary) is None
+    assert v2.reusable(None, old_summary) == {}
+    with pytest.raises(ValueError):
+        get_schema("nope")
+
+
+def test_feature_accumulator_matches_across_chunk_boundaries():
+    text = "It's a test. Words split across chunks! Do they?  Yes... the end"
+    expected, expected_summary = extract_features(text)
+    for size in (1, 2, 3, 7, len(text)):
+        acc = FeatureAccumulator()
+        for i in range(0, len(text), size):
+            acc.update(text[i : i + size])
+        feats, summary = acc.finalize()
+        assert feats.tobytes() == expected.tobytes()
+        assert summary == expected_summary
+
+
+def test_feature_accumulator_estimates_past_exact_limit():
+    import random
+
+    rng = random.Random(0)
+    words = ["".join(rng.choice("abcdefghij") for _ in range(4)) for _ in range(20000)]
+    text = " ".join(words) + "."
+    expected, _ = extract_features(text)
+    acc = FeatureAccumulator(exact_limit=1000)
+    for i in range(0, len(text), 4096):
+        acc.update(text[i : i + 4096])
+    feats, _ = acc.finalize()
+    # token-level counts stay exact, distinct counts are HyperLogLog estimates
+    assert feats[0, 0] == expected[0, 0]
+    assert np.allclose(feats, expected, rtol=0.03)
+
+    # estimates do not depend on the process's string hash seed
+    import subprocess
+    import sys
+
+    script = (
+        "import sys; from app.models.features import FeatureAccumulator as A; a = A(exact_limit=1000); "
+        "a.update(sys.stdin.read()); sys.stdout.write(a.finalize()[0].tobytes().hex())"
+    )
+    for seed in ("1", "2"):
+        out = subprocess.run(
+            [sys.executable, "-c", script],
+            input=text,
+            capture_output=True,
+            text=True,
+            check=True,
+            env={**os.environ, "PYTHONHASHSEED": seed},
+        ).stdout
+        assert out == feats.tobytes().hex()
+
+
+def test_window_features_cover_text_in_token_windows():
+    text = "One two three. Four five six seven! Eight nine ten eleven twelve."
+    feats, spans = extract_window_features(text, 4)
+    assert feats.shape == (3, 10)
+    assert spans == [(0, 19), (20, 41), (42, 64)]
+    # a window holding a whole document scores like the document itself
+    whole, whole_spans = extract_window_features("Just one short line", 50)
+    expected, _ = extract_features("Just one short line")
+    assert whole_spans == [(0, 19)]
+    assert whole.tobytes() == expected.tobytes()
+
+    _, overlapping = extract_window_features(text, 4, 2)
+    assert overlapping[1] == (8, 28)
+
+
 def test_infer_with_mock(monkeypatch):
     # Mock onnx session by overriding infer to be deterministic
     def fake_infer(features: np.ndarray) -> float:
@@ -26,3 +154,219 @@ def test_infer_with_mock(monkeypatch):
     assert 0.0 <= prob <= 1.0
 
 
+
+
+def test_infer_batch_matches_single_rows():
+    feats = extract_features_batch(["One sentence here.", "Another, longer one! With two parts.", ""])
+    probs = onnx_runner.infer_batch(feats)
+    assert probs.shape == (3,)
+    for i in range(3):
+        assert abs(probs[i] - onnx_runner.infer(feats[i : i + 1])) < 1e-9
+
+
+def test_session_options_from_settings(tmp_path, monkeypatch):
+    if onnx_runner.ort is None:
+        pytest.skip("onnxruntime not installed")
+    from app.config import Settings
+
+    model = tmp_path / "cnn.onnx"
+    model.write_bytes(b"")
+    settings = Settings(
+        ORT_INTRA_OP_THREADS=2,
+        ORT_GRAPH_OPTIMIZATION_LEVEL="basic",
+        ORT_EXECUTION_MODE="parallel",
+        ORT_SAVE_OPTIMIZED_MODEL=True,
+    )
+    monkeypatch.setattr(onnx_runner, "get_settings", lambda: settings)
+
+    so, path, tmp = onnx_runner._session_options(str(model), "sha256:abc")
+    assert so.intra_op_num_threads == 2
+    assert so.graph_optimization_level == onnx_runner.ort.GraphOptimizationLevel.ORT_ENABLE_BASIC
+    assert so.execution_mode == onnx_runner.ort.ExecutionMode.ORT_PARALLEL
+    assert path == str(model)
+    # written to a per-process temporary file, renamed into place by load_model
+    assert so.optimized_model_filepath == tmp
+    assert tmp.startswith(str(tmp_path / "cnn.abc.optimized.tmp")) and tmp.endswith(".onnx")
+
+    # an optimized copy of this exact model is loaded directly, without re-optimizing
+    (tmp_path / "cnn.abc.optimized.onnx").write_bytes(b"")
+    so, path, tmp = onnx_runner._session_options(str(model), "sha256:abc")
+    assert path == str(tmp_path / "cnn.abc.optimized.onnx") and tmp is None
+    assert so.graph_optimization_level == onnx_runner.ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+
+    # a different model file, whatever its mtime, is optimized afresh
+    so, path, tmp = onnx_runner._session_options(str(model), "sha256:def")
+    assert path == str(model) and tmp
+
+
+def _fake_sessions(monkeypatch):
+    """Replace onnxruntime sessions with stubs; returns the paths they load."""
+    from types import SimpleNamespace
+
+    if onnx_runner.ort is None:
+        pytest.skip("onnxruntime not installed")
+    loaded_from = []
+
+    def fake_session(path, sess_options, providers):
+        loaded_from.append(path)
+        if sess_options.optimized_model_filepath:
+            with open(sess_options.optimized_model_filepath, "w") as f:
+                f.write("optimized")
+        return SimpleNamespace(
+            get_modelmeta=lambda: SimpleNamespace(custom_metadata_map={}),
+            get_inputs=lambda: [SimpleNamespace(name="x", shape=["N", 10])],
+            get_outputs=lambda: [SimpleNamespace(name="y")],
+        )
+
+    monkeypatch.setattr(onnx_runner.ort, "InferenceSession", fake_session)
+    return loaded_from
+
+
+def test_load_model_saves_optimized_copy_per_checksum(tmp_path, monkeypatch):
+    from app.config import Settings
+
+    loaded_from = _fake_sessions(monkeypatch)
+    monkeypatch.setattr(onnx_runner, "get_settings", lambda: Settings(ORT_SAVE_OPTIMIZED_MODEL=True))
+    model = tmp_path / "cnn.onnx"
+    model.write_text("v1")
+
+    first = onnx_runner.load_model("primary", str(model)).checksum.split(":")[-1]
+    onnx_runner.load_model("primary", str(model))
+    optimized = str(tmp_path / f"cnn.{first}.optimized.onnx")
+    assert loaded_from == [str(model), optimized]
+
+    # a new file keeping the old mtime (cp -p, rsync -a) is still optimized afresh
+    mtime = model.stat().st_mtime_ns
+    model.write_text("v2")
+    os.utime(model, ns=(mtime, mtime))
+    second = onnx_runner.load_model("primary", str(model)).checksum.split(":")[-1]
+    assert loaded_from[-1] == str(model)
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(
+        ["cnn.onnx", f"cnn.{first}.optimized.onnx", f"cnn.{second}.optimized.onnx"]
+    )
+
+
+def test_model_registry_hot_swaps_on_checksum_change(tmp_path, monkeypatch):
+    from app.config import Settings
+    from app.models.feature_schema import get_schema
+
+    loads = []
+
+    def loader(name, path, version):
+        with open(path) as f:
+            value = float(f.read())
+        if value < 0:
+            raise ValueError("corrupt model")
+        loads.append(value)
+        checksum = onnx_runner.file_checksum(path)
+        return onnx_runner.LoadedModel(
+            name, version or checksum, get_schema(), lambda x: np.full(len(x), value), checksum
+        )
+
+    settings = Settings(MODEL_RELOAD_INTERVAL_SECONDS=1e-9)
+    monkeypatch.setattr(onnx_runner, "get_settings", lambda: settings)
+    path = tmp_path / "cnn.onnx"
+    path.write_text("0.25")
+    registry = onnx_runner.ModelRegistry(loader=loader)
+    registry.register("primary", str(path))
+    old = registry.get("primary")
+    assert old.version.startswith("sha256:") and old.infer_batch(np.zeros((2, 10)))[0] == 0.25
+
+    # same bytes under a new mtime: checksummed, not reloaded
+    os.utime(path, ns=(1, 1))
+    assert registry.get("primary") is old
+
+    # a new file renamed into place replaces the model; the old handle still scores
+    tmp = tmp_path / "cnn.onnx.new"
+    tmp.write_text("0.75")
+    os.replace(tmp, path)
+    new = registry.get("primary")
+    assert new.version != old.version and new.infer_batch(np.zeros((1, 10)))[0] == 0.75
+    assert old.infer_batch(np.zeros((1, 10)))[0] == 0.25
+
+    # broken or missing files keep the serving version
+    path.write_text("-1")
+    assert registry.get("primary") is new
+    path.unlink()
+    assert registry.get("primary") is new
+    assert loads == [0.25, 0.75]
+
+    # checks are rate limited by MODEL_RELOAD_INTERVAL_SECONDS (0 = never)
+    path.write_text("0.5")
+    settings.MODEL_RELOAD_INTERVAL_SECONDS = 0
+    assert registry.get("primary") is new
+    with pytest.raises(ValueError):
+        registry.get("nope")
+
+
+def test_pinned_model_version_still_changes_with_the_file(tmp_path, monkeypatch):
+    from app.config import Settings
+
+    _fake_sessions(monkeypatch)
+    monkeypatch.setattr(onnx_runner, "get_settings", lambda: Settings(MODEL_RELOAD_INTERVAL_SECONDS=1e-9))
+    path = tmp_path / "cnn.onnx"
+    path.write_text("v1")
+    registry = onnx_runner.ModelRegistry()
+    registry.register("primary", str(path), "2024-06")
+    old = registry.get("primary")
+    assert old.version == f"2024-06@{old.checksum}"
+
+    # same label, new bytes: a new version, hence new result-cache keys
+    tmp = tmp_path / "cnn.onnx.new"
+    tmp.write_text("v2")
+    os.replace(tmp, path)
+    new = registry.get("primary")
+    assert new is not old
+    assert new.version == f"2024-06@{new.checksum}" != old.version
+
+
+def test_warmup_runs_without_model():
+    onnx_runner.warmup(batch_size=4)
+
+
+def test_sample_text_is_bounded_and_spread():
+    from app.models.langid import sample_text
+
+    text = " ".join(f"w{i:05d}" for i in range(10000))
+    sample = sample_text(text, 600, 3)
+    assert len(sample) <= 600
+    assert sample.startswith("w00000")
+    assert "w099" in sample  # last slice reaches the end
+    assert all(len(word) == 6 for word in sample.split())  # no cut words
+    assert sample_text("short text", 600, 3) == "short text"
+
+
+def test_text_sampler_streams_a_bounded_spread_sample():
+    from app.models.langid import TextSampler
+
+    text = " ".join(f"w{i:05d}" for i in range(10000))
+    sampler = TextSampler(600, 3)
+    for i in range(0, len(text), 97):
+        sampler.update(text[i : i + 97])
+        assert sum(len(b) for _, b in sampler._blocks) <= 2 * 600 + 3
+    sample = sampler.sample()
+    assert len(sample) <= 600
+    assert sample.startswith("w00000")
+    assert any(word >= "w05000" for word in sample.split())
+    assert all(len(word) == 6 for word in sample.split())
+
+    short = TextSampler(600, 3)
+    for part in ("short ", "text"):
+        short.update(part)
+    assert short.sample() == "short text"
+
+
+def test_detect_languages_is_deterministic_and_batched():
+    from app.models import langid
+
+    texts = [
+        "This is an English sentence about the weather and the city. " * 50,
+        "Ceci est une phrase en français sur la ville et le temps qu'il fait. " * 50,
+        "",
+        "12345 67890",
+    ]
+    first = langid.detect_languages(texts)
+    assert first[:2] == ["en", "fr"]
+    assert first[2:] == ["unknown", "unknown"]
+    assert all(langid.detect_languages(texts) == first for _ in range(3))
+    assert langid.get_backend() is langid.get_backend()
@@ -24,7 +24,7 @@ def test_enqueue_has_retry_and_timeout(monkeypatch):
 
     import app.services.queue as qmod
     monkeypatch.setattr(qmod, "Queue", DummyQueue)
-    monkeypatch.setattr(qmod, "redis", type("R", (), {"from_url": staticmethod(lambda url: object())}))
+    monkeypatch.setattr(qmod, "redis", type("R", (), {"from_url": staticmethod(lambda url, **kw: object())}))
 
     jid = enqueue_job("abc")
     assert jid == "jid-1"
@@ -33,3 +33,56 @@ def test_enqueue_has_retry_and_timeout(monkeypatch):
     assert captured["retry"] is not None
 
 
+
+
+def test_batched_enqueue_groups_by_size(monkeypatch):
+    import fakeredis
+    from rq import Queue
+
+    import app.services.queue as qmod
+    from app.config import Settings
+
+    fake = fakeredis.FakeRedis()
+    monkeypatch.setattr(qmod, "redis", type("R", (), {"from_url": staticmethod(lambda url, **kw: fake)}))
+    monkeypatch.setattr(qmod, "get_settings", lambda: Settings(JOB_BATCH_SIZE=3, JOB_BATCH_WINDOW_MS=60000))
+
+    assert qmod.enqueue_job_batched("a") is None
+    assert qmod.enqueue_job_batched("b") is None
+    jid = qmod.enqueue_job_batched("c")
+    assert jid is not None
+
+    q = Queue("jobs", connection=fake)
+    job = q.fetch_job(jid)
+    assert job.func_name.endswith("process_jobs_batch")
+    assert job.args == (["a", "b", "c"],)
+    assert fake.llen(qmod.PENDING_BATCH_KEY) == 0
+    # the first id of the window scheduled a delayed drain for stragglers
+    assert len(q.scheduled_job_registry.get_job_ids()) == 1
+
+
+def test_connection_and_queue_are_reused(monkeypatch):
+    import asyncio
+
+    import fakeredis
+
+    import app.services.queue as qmod
+
+    fake = fakeredis.FakeRedis()
+    calls = []
+
+    def from_url(url, **kw):
+        calls.append(kw)
+        return fake
+
+    monkeypatch.setattr(qmod, "redis", type("R", (), {"from_url": staticmethod(from_url)}))
+
+    ids = qmod.enqueue_many(["a", "b", "c"])
+    ids.append(asyncio.run(qmod.enqueue_job_async("d")))
+    assert len(calls) == 1
+    assert calls[0]["max_connections"] > 0
+    assert qmod._get_queue() is qmod._get_queue()
+
+    q = qmod._get_queue()
+    assert q.job_ids == ids
+    assert [q.fetch_job(jid).args for jid in ids] == [("a",), ("b",), ("c",), ("d",)]
+    assert q.fetch_job(ids[0]).func_name == "app.workers.rq_tasks.process_job"
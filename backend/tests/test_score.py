@@ -0,0 +1,49 @@
+import csv
+import json
+
+from scripts import score
+
+
+def _rows(out):
+    rows = []
+    for path in sorted(out.glob("part-*.csv")):
+        with open(path, newline="") as f:
+            rows.extend(csv.DictReader(f))
+    return rows
+
+
+def test_score_directory_in_chunks_and_resume(tmp_path, capsys):
+    corpus = tmp_path / "corpus"
+    (corpus / "b").mkdir(parents=True)
+    for i in range(5):
+        (corpus / "b" / f"{i}.txt").write_text(f"Document {i}. It has a few words in it!")
+    (corpus / "a.txt").write_text("First in order.")
+    out = tmp_path / "out"
+    argv = [str(corpus), "--out", str(out), "--workers", "1", "--chunk-size", "2"]
+
+    assert score.main(argv) == 0
+    rows = _rows(out)
+    assert [r["id"] for r in rows] == ["a.txt", "b/0.txt", "b/1.txt", "b/2.txt", "b/3.txt", "b/4.txt"]
+    assert all(0.0 <= float(r["probability"]) <= 1.0 and r["feature_schema"] and not r["error"] for r in rows)
+
+    # a lost part is rescored, finished parts are left alone
+    (out / "part-000001.csv").unlink()
+    mtime = (out / "part-000000.csv").stat().st_mtime_ns
+    capsys.readouterr()
+    assert score.main(argv) == 0
+    totals = json.loads(capsys.readouterr().out)
+    assert totals == {"chunks": 1, "documents": 2, "failed": 0, "skipped_chunks": 2}
+    assert (out / "part-000000.csv").stat().st_mtime_ns == mtime
+    assert _rows(out) == rows
+
+
+def test_score_jsonl_records_failures_per_row(tmp_path):
+    source = tmp_path / "docs.jsonl"
+    lines = [json.dumps({"id": "x1", "text": "Hello there, general reader."}), "", "{broken", json.dumps({"text": "No id."})]
+    source.write_text("\n".join(lines) + "\n")
+    out = tmp_path / "out"
+    assert score.main([str(source), "--out", str(out), "--workers", "1"]) == 0
+    rows = _rows(out)
+    assert [r["id"] for r in rows] == ["x1", "3", "4"]
+    assert rows[1]["error"].startswith("JSONDecodeError") and not rows[1]["probability"]
+    assert not rows[0]["error"] and not rows[2]["error"]
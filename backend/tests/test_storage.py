@@ -0,0 +1,55 @@
+import io
+
+import pytest
+
+from app.config import Settings
+from app.services import storage
+
+
+class FakeS3:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.calls = []
+
+    def get_object(self, Bucket, Key, Range=None):
+        self.calls.append(Range)
+        data = self.data
+        if Range:
+            end = int(Range.split("-")[1])
+            data = data[: end + 1]
+        return {"Body": io.BytesIO(data), "ContentLength": len(data)}
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    def install(data: bytes, **overrides):
+        settings = Settings(ENABLE_STORAGE_STUB=False, S3_BUCKET="bucket", STORAGE_CHUNK_BYTES=4, **overrides)
+        client = FakeS3(data)
+        monkeypatch.setattr(storage, "get_settings", lambda: settings)
+        monkeypatch.setattr(storage, "get_s3_client", lambda: client)
+        return client
+
+    return install
+
+
+def test_iter_text_decodes_across_chunk_boundaries(s3):
+    text = "héllo wörld — ünïcode ✓"
+    s3(text.encode("utf-8"))
+    chunks = list(storage.iter_text("k"))
+    assert len(chunks) > 1
+    assert "".join(chunks) == text
+    assert storage.read_text("k") == text
+
+
+def test_read_text_enforces_byte_limit(s3):
+    s3(b"x" * 100, STORAGE_MAX_BYTES=50)
+    with pytest.raises(storage.DocumentTooLarge):
+        storage.read_text("k")
+    assert storage.read_text("k", max_bytes=0) == "x" * 100
+
+
+def test_sample_uses_range_and_drops_partial_char(s3):
+    client = s3("aé".encode("utf-8") * 10)
+    sample = "".join(storage.iter_text("k", sample_bytes=5))
+    assert client.calls == ["bytes=0-4"]
+    assert sample == "aéa"
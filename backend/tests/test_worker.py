@@ -0,0 +1,347 @@
+import uuid
+
+import fakeredis
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from app.config import Settings
+from app.models.feature_schema import get_schema
+from app.models.features import FEATURE_NAMES
+from app.models.onnx_runner import LoadedModel
+from app.repos.db import Base, get_sync_engine
+from app.repos.models import User, Document, Job, Result, ResultCacheEntry
+from app.services import job_events, result_cache
+from app.workers import rq_tasks
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    db_file = tmp_path / "worker.db"
+    settings = Settings(DB_URL=f"sqlite+aiosqlite:///{db_file}")
+    monkeypatch.setattr(rq_tasks, "get_settings", lambda: settings)
+    monkeypatch.setattr(result_cache, "_get_redis", fakeredis.FakeRedis)
+    monkeypatch.setattr(job_events, "_get_redis", fakeredis.FakeRedis)
+    engine = create_engine(f"sqlite+pysqlite:///{db_file}", future=True)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    get_sync_engine(settings.DB_URL).dispose()
+
+
+def _make_job(engine) -> str:
+    with Session(engine) as session:
+        user = User(uid=str(uuid.uuid4()), email="u1@example.com")
+        session.add(user)
+        session.flush()
+        doc = Document(user_id=user.id, s3_key="uploads/u1/a.txt")
+        session.add(doc)
+        session.flush()
+        job_uuid = str(uuid.uuid4())
+        session.add(Job(job_uuid=job_uuid, user_id=user.id, document_id=doc.id, status="PENDING"))
+        session.commit()
+    return job_uuid
+
+
+def _use_models(monkeypatch, predict, version="test", schema="1", shadow=None):
+    primary = LoadedModel("primary", version, get_schema(schema), predict)
+    monkeypatch.setattr(rq_tasks, "current_models", lambda: (primary, shadow))
+
+
+def test_sync_engine_is_shared(db):
+    url = rq_tasks.get_settings().DB_URL
+    engine = get_sync_engine(url)
+    assert engine is get_sync_engine(url)
+    assert engine.url.drivername == "sqlite+pysqlite"
+
+
+def test_process_job_writes_result(db):
+    job_uuid = _make_job(db)
+    rq_tasks.process_job(job_uuid)
+    with Session(db) as session:
+        job = session.scalar(select(Job).where(Job.job_uuid == job_uuid))
+        assert job.status == "SUCCEEDED"
+        result = session.scalar(select(Result).where(Result.job_id == job.id))
+        assert result is not None
+        assert job.result_id == result.id
+        assert 0.0 <= result.probability <= 1.0
+        assert result.summary == f"lang={result.language}"
+        assert set(result.features) == set(FEATURE_NAMES)
+        assert all(isinstance(v, float) for v in result.features.values())
+
+
+def test_process_job_publishes_status_events(db, monkeypatch):
+    import json
+
+    fake = fakeredis.FakeRedis()
+    monkeypatch.setattr(job_events, "_get_redis", lambda: fake)
+    job_uuid = _make_job(db)
+    with Session(db) as session:
+        user_id = session.scalar(select(Job.user_id).where(Job.job_uuid == job_uuid))
+    pubsub = fake.pubsub()
+    pubsub.subscribe(job_events.channel(user_id))
+    rq_tasks.process_job(job_uuid)
+    events = []
+    while (message := pubsub.get_message()) is not None:
+        if message["type"] == "message":
+            events.append(json.loads(message["data"]))
+    assert [e["status"] for e in events] == ["RUNNING", "SUCCEEDED"]
+    assert all(e["id"] == job_uuid for e in events)
+    assert 0.0 <= events[1]["probability"] <= 1.0
+    assert events[1]["latency_ms"] >= 0
+
+
+def test_process_job_marks_failure(db, monkeypatch):
+    job_uuid = _make_job(db)
+
+    def boom(key):
+        raise RuntimeError("storage down")
+
+    monkeypatch.setattr(rq_tasks, "iter_text", boom)
+    rq_tasks.process_job(job_uuid)
+    with Session(db) as session:
+        job = session.scalar(select(Job).where(Job.job_uuid == job_uuid))
+        assert job.status == "FAILED"
+
+
+def test_process_jobs_batch_scores_all_jobs(db, monkeypatch):
+    job_uuids = [_make_job(db) for _ in range(3)]
+    def fake_read(key):
+        return iter(["Batch text number one. It has two sentences."])
+
+    monkeypatch.setattr(rq_tasks, "iter_text", fake_read)
+    rq_tasks.process_jobs_batch(job_uuids + ["missing"])
+    with Session(db) as session:
+        jobs = session.scalars(select(Job).where(Job.job_uuid.in_(job_uuids))).all()
+        assert {j.status for j in jobs} == {"SUCCEEDED"}
+        results = session.scalars(select(Result)).all()
+        assert sorted(r.job_id for r in results) == sorted(j.id for j in jobs)
+        assert {j.result_id: j.id for j in jobs} == {r.id: r.job_id for r in results}
+        assert len({r.probability for r in results}) == 1
+
+
+def test_process_job_reuses_cached_result(db, monkeypatch):
+    fake = fakeredis.FakeRedis()
+    monkeypatch.setattr(result_cache, "_get_redis", lambda: fake)
+    calls = []
+    _use_models(monkeypatch, lambda feats: calls.append(1) or np.full(len(feats), 0.42))
+
+    first, second, third = (_make_job(db) for _ in range(3))
+    rq_tasks.process_job(first)
+    rq_tasks.process_job(second)
+    assert len(calls) == 1
+    assert result_cache.get_stats() == {"hits": 1, "misses": 1}
+
+    # Redis tier lost: the DB tier still answers and refills Redis
+    for key in fake.keys("result_cache:*:*"):
+        fake.delete(key)
+    rq_tasks.process_job(third)
+    assert len(calls) == 1
+    assert fake.keys("result_cache:*:*")
+
+    with Session(db) as session:
+        probs = session.scalars(select(Result.probability)).all()
+        assert probs == [0.42, 0.42, 0.42]
+        assert len(session.scalars(select(ResultCacheEntry)).all()) == 1
+
+
+def test_new_model_reuses_features_shared_with_earlier_schema(db, monkeypatch):
+    from app.models import features
+    from app.models.feature_schema import CAPS, DIGITS
+
+    text = "Report 7 of 12. The Board met on Monday! It approved 3 budgets."
+    monkeypatch.setattr(rq_tasks, "iter_text", lambda key: iter([text]))
+    scans = []
+    real_scan = features._scan
+    monkeypatch.setattr(features, "_scan", lambda t, needs: scans.append(needs) or real_scan(t, needs))
+    inputs = []
+
+    def predict(feats):
+        inputs.append(feats)
+        return np.full(len(feats), 0.5)
+
+    _use_models(monkeypatch, predict)
+
+    first, second = _make_job(db), _make_job(db)
+    rq_tasks.process_job(first)
+    # retrained model on schema 2: only caps_ratio@2 and digit_ratio@2 are new
+    _use_models(monkeypatch, predict, version="retrained", schema="2")
+    rq_tasks.process_job(second)
+
+    assert scans[1] == {CAPS, DIGITS}
+    assert inputs[1].tobytes() == features.extract_features(text, get_schema("2"))[0].tobytes()
+    with Session(db) as session:
+        old, new = session.scalars(select(Result).order_by(Result.id)).all()
+        assert (old.feature_schema, new.feature_schema) == ("1", "2")
+        assert old.features["caps_ratio"] == old.features["digit_ratio"] == 0.0
+        assert new.features["caps_ratio"] > 0 and new.features["digit_ratio"] > 0
+        assert {k: v for k, v in new.features.items() if k not in ("caps_ratio", "digit_ratio")} == {
+            k: v for k, v in old.features.items() if k not in ("caps_ratio", "digit_ratio")
+        }
+
+
+def test_shadow_model_scores_every_job_next_to_primary(db, monkeypatch):
+    text = "Shadow scoring text. Second sentence!"
+    monkeypatch.setattr(rq_tasks, "iter_text", lambda key: iter([text]))
+    shadow = LoadedModel("shadow", "candidate", get_schema("2"), lambda feats: np.full(len(feats), 0.9))
+    _use_models(monkeypatch, lambda feats: np.full(len(feats), 0.2), version="current", shadow=shadow)
+    single = _make_job(db)
+    batch = [_make_job(db), _make_job(db)]
+    rq_tasks.process_job(single)
+    rq_tasks.process_jobs_batch(batch)
+
+    def broken(feats):
+        raise RuntimeError("bad candidate")
+
+    failing = LoadedModel("shadow", "broken", get_schema(), broken)
+    _use_models(monkeypatch, lambda feats: np.full(len(feats), 0.2), version="current", shadow=failing)
+    unaffected = _make_job(db)
+    rq_tasks.process_job(unaffected)
+
+    with Session(db) as session:
+        rows = session.execute(
+            select(
+                Job.status,
+                Result.probability,
+                Result.model_version,
+                Result.shadow_probability,
+                Result.shadow_model_version,
+            )
+            .join(Result, Result.id == Job.result_id)
+            .order_by(Job.id)
+        ).all()
+        assert [tuple(r) for r in rows] == [("SUCCEEDED", 0.2, "current", 0.9, "candidate")] * 3 + [
+            ("SUCCEEDED", 0.2, "current", None, None)
+        ]
+        # cached payloads are keyed on the model pair, shadow score included
+        assert set(session.scalars(select(ResultCacheEntry.model_version))) == {"current+candidate", "current+broken"}
+
+
+def test_segmented_scoring_stores_window_probabilities(db, monkeypatch):
+    settings = Settings(
+        DB_URL=rq_tasks.get_settings().DB_URL,
+        SEGMENTED_SCORING_ENABLED=True,
+        SEGMENT_WINDOW_TOKENS=4,
+    )
+    monkeypatch.setattr(rq_tasks, "get_settings", lambda: settings)
+    text = "One two three. Four five six seven! Eight nine ten eleven twelve."
+    monkeypatch.setattr(rq_tasks, "iter_text", lambda key: iter([text]))
+    _use_models(monkeypatch, lambda feats: np.linspace(0.1, 0.9, len(feats)))
+
+    job_uuid = _make_job(db)
+    rq_tasks.process_job(job_uuid)
+    with Session(db) as session:
+        result = session.scalar(select(Result))
+        assert [text[s["start"] : s["end"]] for s in result.segments] == [
+            "One two three. Four",
+            "five six seven! Eight",
+            "nine ten eleven twelve",
+        ]
+        assert [round(s["probability"], 2) for s in result.segments] == [0.1, 0.5, 0.9]
+        assert result.probability == pytest.approx(0.5)
+
+
+def test_cached_results_are_keyed_on_the_scoring_mode(db, monkeypatch):
+    text = "One two three. Four five six seven! Eight nine ten eleven twelve."
+    monkeypatch.setattr(rq_tasks, "iter_text", lambda key: iter([text]))
+    _use_models(monkeypatch, lambda feats: np.linspace(0.1, 0.9, len(feats)))
+    url = rq_tasks.get_settings().DB_URL
+    modes = [
+        Settings(DB_URL=url),
+        Settings(DB_URL=url, SEGMENTED_SCORING_ENABLED=True, SEGMENT_WINDOW_TOKENS=4),
+        Settings(DB_URL=url, SEGMENTED_SCORING_ENABLED=True, SEGMENT_WINDOW_TOKENS=4, SEGMENT_AGGREGATE="max"),
+        Settings(DB_URL=url),
+    ]
+    for settings in modes:
+        monkeypatch.setattr(rq_tasks, "get_settings", lambda settings=settings: settings)
+        rq_tasks.process_job(_make_job(db))
+
+    with Session(db) as session:
+        results = session.scalars(select(Result).order_by(Result.id)).all()
+        assert [r.probability for r in results] == pytest.approx([0.1, 0.5, 0.9, 0.1])
+        assert [r.segments is not None for r in results] == [False, True, True, False]
+        assert set(session.scalars(select(ResultCacheEntry.model_version))) == {
+            "test",
+            "test|seg4/4/mean",
+            "test|seg4/4/max",
+        }
+
+
+def test_long_document_is_scored_from_the_stream(db, monkeypatch):
+    from app.models import features
+
+    settings = Settings(DB_URL=rq_tasks.get_settings().DB_URL, STREAM_FEATURES_MIN_CHARS=100)
+    monkeypatch.setattr(rq_tasks, "get_settings", lambda: settings)
+    texts = [
+        "\n  " + "The committee met again. It voted on 3 items, then adjourned!  " * 20 + "\t\n",
+        "A different, longer report follows. " * 30,
+    ]
+    current = []
+    monkeypatch.setattr(
+        rq_tasks, "iter_text", lambda key: (current[0][i : i + 7] for i in range(0, len(current[0]), 7))
+    )
+    scans = []
+    real_scan = features._scan
+    monkeypatch.setattr(features, "_scan", lambda t, needs: scans.append(t) or None)
+    _use_models(monkeypatch, lambda feats: feats[:, 0] / 10)
+
+    current.append(texts[0])
+    rq_tasks.process_job(_make_job(db))
+    current[0] = texts[1]
+    rq_tasks.process_jobs_batch([_make_job(db)])
+    # neither entry point joins the text and scans it whole
+    assert scans == []
+    monkeypatch.setattr(features, "_scan", real_scan)
+    with Session(db) as session:
+        results = session.scalars(select(Result).order_by(Result.id)).all()
+        assert len(results) == 2
+        for result, text in zip(results, texts):
+            expected = rq_tasks.score_texts([text.strip()])[0]
+            assert (result.probability, result.features, result.language) == (
+                expected["probability"],
+                expected["features"],
+                expected["language"],
+            )
+        entries = session.scalars(select(ResultCacheEntry.content_hash).order_by(ResultCacheEntry.id)).all()
+        assert entries == [result_cache.content_hash(text.strip()) for text in texts]
+
+
+def test_preloaded_worker_runs_jobs_in_process(db, monkeypatch):
+    import os
+
+    import fakeredis
+    from rq import Queue
+
+    from app.workers import runner
+
+    preloads = []
+    monkeypatch.setattr(runner, "preload", lambda: preloads.append(os.getpid()))
+    fake = fakeredis.FakeRedis()
+    q = Queue("jobs", connection=fake)
+    job_uuids = [_make_job(db) for _ in range(2)]
+    for job_uuid in job_uuids:
+        q.enqueue(rq_tasks.process_job, job_uuid)
+
+    worker = runner.PreloadedWorker([q], connection=fake)
+    worker.work(burst=True)
+
+    assert preloads == [os.getpid()]
+    with Session(db) as session:
+        statuses = session.scalars(select(Job.status).where(Job.job_uuid.in_(job_uuids))).all()
+        assert statuses == ["SUCCEEDED", "SUCCEEDED"]
+
+
+def test_process_job_records_stage_metrics(db):
+    from prometheus_client import REGISTRY
+
+    def sample(name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0.0
+
+    stages = ("read", "langdetect", "features", "inference", "db_write")
+    before = {s: sample("worker_stage_seconds_count", stage=s) for s in stages}
+    succeeded = sample("jobs_processed_total", outcome="succeeded")
+    waits = sample("job_queue_wait_seconds_count")
+    rq_tasks.process_job(_make_job(db))
+    assert all(sample("worker_stage_seconds_count", stage=s) == before[s] + 1 for s in stages)
+    assert sample("jobs_processed_total", outcome="succeeded") == succeeded + 1
+    assert sample("job_queue_wait_seconds_count") == waits + 1
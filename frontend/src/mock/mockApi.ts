@@ -42,7 +42,7 @@ export const mockApi = {
           j.latency_ms = Math.floor(run);
           j.finished_at = nowISO();
           j.status = 'DONE';
-          j.feature_summary = {
+          j.features = {
             avg_word_len: +(3 + Math.random() * 3).toFixed(2),
             ttr: +(0.3 + Math.random() * 0.4).toFixed(2),
             punctuation_ratio: +(0.05 + Math.random() * 0.1).toFixed(3),
@@ -1,6 +1,6 @@
 import { useEffect, useState } from 'react';
 import { useParams } from 'react-router-dom';
-import { getJob, cancelJob, rerunJob } from '../services/jobs';
+import { getJob, cancelJob, rerunJob, watchJob } from '../services/jobs';
 import type { Job } from '../types';
 import { StatusChip } from '../components/StatusChip';
 import { ProbabilityGauge } from '../components/ProbabilityGauge';
@@ -8,15 +8,22 @@ import { ProbabilityGauge } from '../components/ProbabilityGauge';
 export default function JobDetail() {
   const { id } = useParams();
   const [job, setJob] = useState<Job | undefined>();
+  const [streamFailed, setStreamFailed] = useState(false);
   async function load(){ if (id) setJob(await getJob(id)); }
-  useEffect(()=>{ load(); }, [id]);
+  useEffect(()=>{ load(); setStreamFailed(false); }, [id]);
+  const active = !!job && ['PENDING','QUEUED','RUNNING'].includes(job.status);
+  // Push updates while the job is in flight; poll only if the stream is unavailable
   useEffect(()=>{
-    if (!job) return;
+    if (!id || !active || streamFailed) return;
+    return watchJob(id, u => setJob(j => j && { ...j, ...u }), () => setStreamFailed(true));
+  }, [id, active, streamFailed]);
+  useEffect(()=>{
+    if (!job || !streamFailed) return;
     if (['PENDING','QUEUED','RUNNING'].includes(job.status)) {
       const t = setTimeout(load, 1500);
       return ()=>clearTimeout(t);
     }
-  }, [job]);
+  }, [job, streamFailed]);
 
   if (!job) return <div style={{ padding: 24 }}>Loading…</div>;
 
@@ -55,7 +62,7 @@ export default function JobDetail() {
       </div>
       <div style={{ border: '1px solid #e5e7eb', borderRadius: 8, padding: 12 }}>
         <div style={{ fontWeight: 600, marginBottom: 8 }}>Feature summary</div>
-        <pre style={{ fontSize: 12, background: '#f9fafb', padding: 8, borderRadius: 6, overflow: 'auto' }}>{JSON.stringify(job.feature_summary ?? {}, null, 2)}</pre>
+        <pre style={{ fontSize: 12, background: '#f9fafb', padding: 8, borderRadius: 6, overflow: 'auto' }}>{JSON.stringify(job.features ?? {}, null, 2)}</pre>
       </div>
       <div style={{ display: 'flex', gap: 8 }}>
         {['QUEUED','RUNNING'].includes(job.status) && <button style={{ padding: '6px 12px', border: '1px solid #e5e7eb', borderRadius: 6 }} onClick={()=>cancelJob(job.id).then(load)}>Cancel</button>}
@@ -1,4 +1,5 @@
 import { api } from '../lib/api';
+import { auth } from '../lib/firebase';
 import type { Job } from '../types';
 import { mockApi } from '../mock/mockApi';
 
@@ -12,9 +13,10 @@ export async function createJobs(files: File[], lang?: string) {
   return data as Job[];
 }
 
-export async function listJobs(params: { q?: string; status?: string[]; page?: number; page_size?: number }) {
+export async function listJobs(params: { q?: string; status?: string[]; page?: number; page_size?: number; cursor?: number; include_results?: boolean }) {
   if (useMock) return mockApi.listJobs(params);
-  const { data } = await api.get('/api/jobs', { params });
+  // repeat array params as status=A&status=B (axios defaults to status[]=A)
+  const { data } = await api.get('/api/jobs', { params, paramsSerializer: { indexes: null } });
   return data;
 }
 
@@ -24,6 +26,36 @@ export async function getJob(id: string) {
   return data as Job;
 }
 
+// Follows a job over Server-Sent Events until it finishes. fetch is used
+// instead of EventSource so the bearer token can be sent as a header.
+// Returns a function that closes the stream; onError fires if it drops.
+export function watchJob(id: string, onUpdate: (update: Partial<Job>) => void, onError: () => void) {
+  const controller = new AbortController();
+  if (useMock) { onError(); return () => controller.abort(); }
+  (async () => {
+    const token = await auth.currentUser?.getIdToken();
+    const res = await fetch(`${api.defaults.baseURL}/api/jobs/events?job_id=${encodeURIComponent(id)}`, {
+      headers: token ? { Authorization: `Bearer ${token}` } : {},
+      signal: controller.signal
+    });
+    if (!res.ok || !res.body) throw new Error(`events: ${res.status}`);
+    const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buf = '';
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) throw new Error('events: closed');
+      buf += value;
+      let end;
+      while ((end = buf.indexOf('\n\n')) >= 0) {
+        const data = buf.slice(0, end).split('\n').find(l => l.startsWith('data: '));
+        buf = buf.slice(end + 2);
+        if (data) onUpdate(JSON.parse(data.slice(6)));
+      }
+    }
+  })().catch(() => { if (!controller.signal.aborted) onError(); });
+  return () => controller.abort();
+}
+
 export async function cancelJob(id: string) {
   if (useMock) return mockApi.cancelJob(id);
   await api.post(`/api/jobs/${id}/cancel`, {});
@@ -18,7 +18,9 @@ export interface Job {
   error_msg?: string | null;
   created_at: string;
   s3_key?: string;
-  feature_summary?: Record<string, number>;
+  features?: Record<string, number> | null;
+  feature_schema?: string | null;
+  segments?: Array<{ start: number; end: number; probability: number }> | null;
 }
 
 export interface DashboardMetrics {